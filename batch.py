@@ -0,0 +1,212 @@
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from board import Board
+from bitboard import BitBoard
+from engine import Engine
+from perft import PERFT_SUITE
+from pieces import Pawn, Knight, Bishop, Rook, Queen, King
+from tables import piece_square_tables
+from utils import fen_to_coords, parse_epd
+
+# Scores many positions at once for analysis and tuning, giving exactly what Engine.evaluate_board would.
+#
+# A position is encoded as 12 planes of 64 squares, one plane for each piece type and colour (White's
+# pawns, knights, ..., kings, then Black's), with a 1 wherever that piece stands. Every plane and square
+# has a fixed weight, its piece's material value plus its piece-square value, so a batch of positions is
+# scored by one matrix product of the planes with the weights.
+#
+# This is the only part of the project that needs NumPy (pip install numpy); the engine, GUI and UCI
+# entry point don't import it. Run with --check to compare the batch scores with the engine's own.
+PIECE_TYPES = "pnbrqk"
+PIECE_VALUES = {"p": Pawn.value, "n": Knight.value, "b": Bishop.value, "r": Rook.value, "q": Queen.value, "k": King.value}
+
+PLANES = 2 * len(PIECE_TYPES)
+BATCH_SIZE = 4096 # Positions encoded and scored at a time by the command line tool
+CHECK_PLIES = 40 # Random moves played from each perft position to get more positions for --check
+
+def plane_index(piece_type, colour):
+    return PIECE_TYPES.index(piece_type) + (0 if colour == 1 else len(PIECE_TYPES))
+
+def make_weights(square_tables=piece_square_tables):
+    """The (12, 64) weight of each piece on each square, from White's point of view.
+
+    This matches Engine.count_board term by term: White adds the value and its table entry at
+    table[x][y], while Black subtracts the value and adds the mirrored entry at table[7-x][y].
+    """
+    weights = []
+
+    for colour in (1, -1):
+        for piece_type in PIECE_TYPES:
+            table = square_tables[piece_type]
+            value = PIECE_VALUES[piece_type] * colour
+            plane = []
+
+            for index in range(64):
+                x, y = index % 8, index // 8
+                plane.append(value + (table[x][y] if colour == 1 else table[7-x][y]))
+
+            weights.append(plane)
+
+    return np.array(weights) # Integer unless a tuned table has fractional values, so sums stay exact
+
+def encode_boards(boards):
+    """Encodes a sequence of boards as an (N, 12, 64) array of piece planes and an (N,) array of sides to move"""
+    planes = np.zeros((len(boards), PLANES, 64), dtype=np.int8)
+    colours = np.empty(len(boards), dtype=np.int8)
+
+    for number, board in enumerate(boards):
+        for piece in board.pieces:
+            x, y = piece.coords
+            planes[number, plane_index(piece.piece_type, piece.colour), y * 8 + x] = 1
+
+        colours[number] = board.turn
+
+    return planes, colours
+
+def encode_fens(fens):
+    """Encodes FEN strings the same way as encode_boards, without building a board for each of them"""
+    planes = np.zeros((len(fens), PLANES, 64), dtype=np.int8)
+    colours = np.empty(len(fens), dtype=np.int8)
+
+    for number, fen in enumerate(fens):
+        for character, squares in fen_to_coords(fen).items():
+            plane = plane_index(character.lower(), 1 if character.isupper() else -1)
+
+            for x, y in squares:
+                planes[number, plane, y * 8 + x] = 1
+
+        fields = fen.split()
+        colours[number] = -1 if len(fields) > 1 and fields[1] == "b" else 1
+
+    return planes, colours
+
+def evaluate_batch(planes, colours=None, weights=None):
+    """Material and piece-square scores for a batch of encoded positions.
+
+    Scores are from the side to move's point of view like Engine.evaluate_board, or from White's
+    if no colours are given. Pass weights from make_weights to score with other piece-square tables.
+    """
+    if weights is None:
+        weights = make_weights()
+
+    # Widen before multiplying so the sums can't overflow the int8 planes
+    scores = planes.reshape(len(planes), PLANES * 64).astype(weights.dtype) @ weights.reshape(PLANES * 64)
+
+    if colours is not None:
+        scores = scores * colours
+
+    return scores
+
+def evaluate_boards(boards):
+    """Scores boards from the side to move's point of view, using each board class's own tables"""
+    if not boards:
+        return np.zeros(0, dtype=np.int64)
+
+    planes, colours = encode_boards(boards)
+    return evaluate_batch(planes, colours, make_weights(type(boards[0]).square_tables))
+
+def read_fens(file):
+    """Yields a FEN for every FEN or EPD line in a file, skipping blank lines and comments"""
+    for line in file:
+        line = line.strip()
+
+        if not line or line.startswith("#"):
+            continue
+
+        fields = line.split()
+        yield line if len(fields) == 6 and fields[4].isdigit() else parse_epd(line)[0]
+
+def check_positions(seed=0):
+    """The perft suite positions and the positions along a random game from each, as FEN strings"""
+    rng = random.Random(seed)
+    fens = []
+
+    for _, fen, _ in PERFT_SUITE:
+        board = Board(fen)
+        fens.append(fen)
+
+        for _ in range(CHECK_PLIES):
+            moves = board.get_legal_moves(board.turn)
+            if not moves:
+                break
+
+            board.make_move(*rng.choice(moves))
+            fens.append(board.to_fen())
+
+    return fens
+
+def check(seed=0):
+    """Compares the batch scores with the engine's on the check positions, returning the number that differ.
+
+    Each position is scored on both boards with the default piece-square tables and with random
+    ones, which unlike the defaults aren't symmetrical, so mirroring mistakes can't cancel out.
+    """
+    rng = random.Random(seed)
+    tuned_tables = {
+        piece_type: [[rng.randint(-50, 50) for _ in range(8)] for _ in range(8)] for piece_type in PIECE_TYPES
+    }
+
+    fens = check_positions(seed)
+    engine = Engine(1)
+    mismatches = 0
+
+    for name, tables in (("default tables", piece_square_tables), ("random tables", tuned_tables)):
+        weights = make_weights(tables)
+        fen_scores = evaluate_batch(*encode_fens(fens), weights)
+
+        for board_class in (Board, BitBoard):
+            tuned_class = type("Tuned" + board_class.__name__, (board_class,), {"square_tables": tables})
+            boards = [tuned_class(fen) for fen in fens]
+            scores = evaluate_boards(boards)
+
+            for fen, board, score, fen_score in zip(fens, boards, scores, fen_scores):
+                # Engine.count_board always uses the default tables, the board's running total uses its own
+                expected = [engine.evaluate_board(board, board.turn)]
+                if tables is piece_square_tables:
+                    expected.append(engine.count_board(board, board.turn))
+
+                if any(score != value for value in expected) or fen_score != score:
+                    mismatches += 1
+                    print(f"{board_class.__name__}, {name}: batch {score}, from FEN {fen_score}, engine {expected}: {fen}")
+
+            print(f"{board_class.__name__:8} {name:15} {len(boards)} positions")
+
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Score positions with the engine's static evaluation")
+    parser.add_argument("positions", nargs="?", help="FEN or EPD file, one position per line (default: stdin)")
+    parser.add_argument("--white", action="store_true", help="score from White's point of view instead of the side to move's")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--check", action="store_true", help="compare the batch scores with the engine's and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check()
+        print("All scores match" if not mismatches else f"{mismatches} scores differ")
+        sys.exit(1 if mismatches else 0)
+
+    weights = make_weights(Board.square_tables)
+    file = open(args.positions) if args.positions else sys.stdin
+
+    with file:
+        fens = read_fens(file)
+
+        while True:
+            batch = [fen for _, fen in zip(range(args.batch_size), fens)]
+
+            if not batch:
+                break
+
+            planes, colours = encode_fens(batch)
+            scores = evaluate_batch(planes, None if args.white else colours, weights)
+
+            for fen, score in zip(batch, scores):
+                print(f"{score}\t{fen}")
+
+if __name__ == "__main__":
+    main()
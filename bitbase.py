@@ -0,0 +1,235 @@
+import argparse
+import mmap
+import os
+import time
+
+from collections import deque
+from bitboard import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, rook_attacks, queen_attacks, squares_of
+
+# Win/draw bitbases for king and one piece against a lone king.
+#
+# Positions are indexed as (side to move, strong king, piece, weak king) with squares numbered like
+# Board.squares (index = y * 8 + x). The strong side is always stored as White, so for Black's pieces
+# the board is flipped top to bottom first. One bit per position says whether the strong side wins;
+# the weak side can never win these endings, so anything else is a draw.
+STRONG_TO_MOVE = 0
+WEAK_TO_MOVE = 1
+
+TABLE_SIZE = 2 * 64 * 64 * 64
+
+ENDGAMES = ("q", "r", "p") # Generated in this order since pawn endings need the queen results for promotions
+
+# Results of a probe, from the side to move's point of view
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+def position_index(side_to_move, strong_king, piece, weak_king):
+    return ((side_to_move * 64 + strong_king) * 64 + piece) * 64 + weak_king
+
+def piece_attacks(piece_type, index, occupied):
+    """Squares attacked by the strong side's piece (a White pawn for pawn endings)"""
+    if piece_type == "q":
+        return queen_attacks(index, occupied)
+    if piece_type == "r":
+        return rook_attacks(index, occupied)
+    if piece_type == "b":
+        return bishop_attacks(index, occupied)
+    if piece_type == "n":
+        return KNIGHT_ATTACKS[index]
+
+    return PAWN_ATTACKS[1][index]
+
+def piece_sources(piece_type, index, occupied):
+    """Squares the strong side's piece could have come from to reach a square"""
+    if piece_type != "p":
+        return piece_attacks(piece_type, index, occupied) & ~occupied
+
+    # Pawns move towards y = 0, so they came from the square below (or two below from their starting rank)
+    sources = 0
+    y = index // 8
+
+    if y <= 5 and not occupied & (1 << (index + 8)):
+        sources |= 1 << (index + 8)
+
+        if y == 4 and not occupied & (1 << (index + 16)):
+            sources |= 1 << (index + 16)
+
+    return sources
+
+def generate(piece_type, queen_results=None):
+    """Solves an ending by retrograde analysis, returning one bit per position (1 = strong side wins).
+
+    Starting from every checkmate, wins are propagated backwards: a position with the strong side to move
+    is won if any move reaches a won position, and one with the weak side to move is won once every one of
+    its moves has been shown to reach a won position.
+    """
+    won = bytearray(TABLE_SIZE) # 0 = undecided, 1 = won for the strong side, 2 = impossible position
+    moves_left = bytearray(TABLE_SIZE) # Weak side moves not yet known to lose
+    queue = deque()
+
+    for strong_king in range(64):
+        for piece in range(64):
+            for weak_king in range(64):
+                strong_index = position_index(STRONG_TO_MOVE, strong_king, piece, weak_king)
+                weak_index = position_index(WEAK_TO_MOVE, strong_king, piece, weak_king)
+
+                impossible = (
+                    len({strong_king, piece, weak_king}) < 3
+                    or KING_ATTACKS[strong_king] & (1 << weak_king)
+                    or (piece_type == "p" and piece // 8 in (0, 7))
+                )
+
+                if impossible:
+                    won[strong_index] = won[weak_index] = 2
+                    continue
+
+                occupied = (1 << strong_king) | (1 << piece) | (1 << weak_king)
+                in_check = piece_attacks(piece_type, piece, occupied) & (1 << weak_king)
+
+                # With the strong side to move, the weak king can't already be in check
+                if in_check:
+                    won[strong_index] = 2
+                elif piece_type == "p" and piece // 8 == 1 and not occupied & (1 << (piece - 8)):
+                    # Promoting to a queen wins if the queen ending is won with the weak side to move
+                    promoted = position_index(WEAK_TO_MOVE, strong_king, piece - 8, weak_king)
+
+                    if queen_results[promoted >> 3] & (1 << (promoted & 7)):
+                        won[strong_index] = 1
+                        queue.append(strong_index)
+
+                # Count the weak king's legal moves, with the king itself removed so it can't hide behind itself
+                count = 0
+                without_king = occupied & ~(1 << weak_king)
+
+                for target in squares_of(KING_ATTACKS[weak_king] & ~KING_ATTACKS[strong_king] & ~(1 << strong_king)):
+                    # Taking the undefended piece is always allowed (and draws)
+                    if target == piece or not piece_attacks(piece_type, piece, without_king) & (1 << target):
+                        count += 1
+
+                moves_left[weak_index] = count
+
+                if count == 0 and in_check:
+                    won[weak_index] = 1 # Checkmate
+                    queue.append(weak_index)
+
+    while queue:
+        index = queue.popleft()
+
+        weak_king = index & 63
+        piece = (index >> 6) & 63
+        strong_king = (index >> 12) & 63
+        side_to_move = index >> 18
+
+        occupied = (1 << strong_king) | (1 << piece) | (1 << weak_king)
+
+        if side_to_move == WEAK_TO_MOVE:
+            # Any strong move into this position wins
+            predecessors = [
+                position_index(STRONG_TO_MOVE, source, piece, weak_king)
+                for source in squares_of(KING_ATTACKS[strong_king] & ~occupied)
+            ]
+            predecessors += [
+                position_index(STRONG_TO_MOVE, strong_king, source, weak_king)
+                for source in squares_of(piece_sources(piece_type, piece, occupied & ~(1 << piece)))
+            ]
+
+            for predecessor in predecessors:
+                if won[predecessor] == 0:
+                    won[predecessor] = 1
+                    queue.append(predecessor)
+        else:
+            # A weak position is lost once none of its moves escape
+            for source in squares_of(KING_ATTACKS[weak_king] & ~occupied):
+                predecessor = position_index(WEAK_TO_MOVE, strong_king, piece, source)
+
+                if won[predecessor] == 0:
+                    moves_left[predecessor] -= 1
+
+                    if moves_left[predecessor] == 0:
+                        won[predecessor] = 1
+                        queue.append(predecessor)
+
+    # Pack eight positions into each byte
+    bits = bytearray(TABLE_SIZE // 8)
+    for index in range(TABLE_SIZE):
+        if won[index] == 1:
+            bits[index >> 3] |= 1 << (index & 7)
+
+    return bits
+
+class Bitbases:
+    """Memory-mapped bitbases for KQK, KRK and KPK, probed in constant time"""
+    def __init__(self, directory="bitbases"):
+        self.directory = directory
+        self.tables = {}
+        self.files = []
+
+        for piece_type in ENDGAMES:
+            path = os.path.join(directory, f"k{piece_type}k.bin")
+
+            if os.path.exists(path):
+                file = open(path, "rb")
+                self.files.append(file)
+                self.tables[piece_type] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+
+        for file in self.files:
+            file.close()
+
+    def probe(self, board, colour):
+        """Returns WIN, DRAW or LOSS for the side to move, or None if the position isn't covered"""
+        pieces = board.pieces
+
+        if len(pieces) == 2:
+            return DRAW # Only the kings are left
+
+        if len(pieces) != 3:
+            return None
+
+        kings = [piece for piece in pieces if piece.piece_type == "k"]
+        others = [piece for piece in pieces if piece.piece_type != "k"]
+
+        if len(kings) != 2 or others[0].piece_type not in self.tables:
+            return None
+
+        piece = others[0]
+        strong = piece.colour
+        strong_king, weak_king = kings if kings[0].colour == strong else kings[::-1]
+
+        def square(coords):
+            # Flip Black's pieces so the strong side is always White
+            x, y = coords
+            return (y if strong == 1 else 7 - y) * 8 + x
+
+        side_to_move = STRONG_TO_MOVE if colour == strong else WEAK_TO_MOVE
+        index = position_index(side_to_move, square(strong_king.coords), square(piece.coords), square(weak_king.coords))
+
+        if not self.tables[piece.piece_type][index >> 3] & (1 << (index & 7)):
+            return DRAW
+
+        return WIN if colour == strong else LOSS
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK bitbases")
+    parser.add_argument("-o", "--output", default="bitbases", help="directory to write the tables to")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    results = {}
+
+    for piece_type in ENDGAMES:
+        start = time.perf_counter()
+        results[piece_type] = generate(piece_type, results.get("q"))
+
+        path = os.path.join(args.output, f"k{piece_type}k.bin")
+        with open(path, "wb") as file:
+            file.write(results[piece_type])
+
+        print(f"Wrote {path} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+from board import Board, STARTING_FEN
+from tables import square_coords, knight_targets, king_targets, pawn_attacks, rays, between, lines
+
+# Squares are numbered the same way as Board.squares: index = y * 8 + x, with a8 = 0 and h1 = 63
+FULL = (1 << 64) - 1
+
+# (x, y) coordinates for every square index so we don't rebuild tuples while generating moves.
+# Shared with the pieces, so the tuple for a square is always the same object
+SQUARE_COORDS = square_coords
+
+def bit(x, y):
+    return 1 << (y * 8 + x)
+
+def squares_of(bitboard):
+    """Yields the index of every set bit in a bitboard"""
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+def mask_of(indices):
+    """A bitboard with a bit set for each square index"""
+    mask = 0
+    for index in indices:
+        mask |= 1 << index
+
+    return mask
+
+def line_mask(index, dx, dy):
+    """Every square on the line through a square in both directions, excluding the square itself"""
+    neighbours = rays[(dx, dy)][index] + rays[(-dx, -dy)][index]
+    if not neighbours:
+        return 0 # A corner square alone on its diagonal
+
+    return mask_of(lines[index][neighbours[0]]) & ~(1 << index)
+
+# The square tables from tables.py as bitboards
+KNIGHT_ATTACKS = tuple(mask_of(targets) for targets in knight_targets)
+KING_ATTACKS = tuple(mask_of(targets) for targets in king_targets)
+
+# Squares attacked by a pawn of each colour, white pawns attack towards y = 0
+PAWN_ATTACKS = {colour: tuple(mask_of(targets) for targets in pawn_attacks[colour]) for colour in (1, -1)}
+
+FILE_MASKS = tuple(line_mask(index, 0, 1) for index in range(64))
+DIAGONAL_MASKS = tuple(line_mask(index, 1, 1) for index in range(64))
+ANTI_DIAGONAL_MASKS = tuple(line_mask(index, 1, -1) for index in range(64))
+
+def first_rank_attacks():
+    """Attacks along a single rank for every file and every occupancy of the six inner squares"""
+    table = []
+
+    for x in range(8):
+        row = []
+        for inner in range(64):
+            occupancy = inner << 1
+            attacks = 0
+
+            for step in (-1, 1):
+                nx = x + step
+                while 0 <= nx < 8:
+                    attacks |= 1 << nx
+                    if occupancy & (1 << nx):
+                        break
+                    nx += step
+
+            row.append(attacks)
+        table.append(tuple(row))
+
+    return tuple(table)
+
+RANK_ATTACKS = first_rank_attacks()
+
+BETWEEN = tuple(tuple(mask_of(squares) for squares in row) for row in between) # Squares strictly between two squares
+
+def flip_vertical(bitboard):
+    """Mirrors a bitboard top to bottom by reversing the order of its bytes"""
+    return int.from_bytes(bitboard.to_bytes(8, "little"), "big")
+
+def line_attacks(index, occupied, mask):
+    """Hyperbola quintessence: attacks along a file or diagonal given the occupied squares"""
+    square = 1 << index
+    forward = occupied & mask
+    reverse = flip_vertical(forward)
+
+    forward = (forward - square) & FULL
+    reverse = (reverse - flip_vertical(square)) & FULL
+
+    return (forward ^ flip_vertical(reverse)) & mask
+
+def rank_attacks(index, occupied):
+    """Attacks along a rank, looked up from the first rank table"""
+    x, y = SQUARE_COORDS[index]
+    shift = y * 8
+    inner = (occupied >> (shift + 1)) & 63
+
+    return RANK_ATTACKS[x][inner] << shift
+
+def bishop_attacks(index, occupied):
+    return line_attacks(index, occupied, DIAGONAL_MASKS[index]) | line_attacks(index, occupied, ANTI_DIAGONAL_MASKS[index])
+
+def rook_attacks(index, occupied):
+    return line_attacks(index, occupied, FILE_MASKS[index]) | rank_attacks(index, occupied)
+
+def queen_attacks(index, occupied):
+    return bishop_attacks(index, occupied) | rook_attacks(index, occupied)
+
+PIECE_TYPES = ("p", "n", "b", "r", "q", "k")
+
+class BitBoard(Board):
+    """Board backend that keeps the position in 64-bit integer bitboards for fast move generation.
+
+    The piece objects and history are still maintained by Board, so this can be used
+    anywhere a Board is expected (the GUI, the engine) without changes.
+    """
+    def __init__(self, fen=STARTING_FEN):
+        # One bitboard per piece type for each colour, plus the occupancy of each side
+        self.bitboards = {colour: {piece_type: 0 for piece_type in PIECE_TYPES} for colour in (1, -1)}
+        self.occupancy = {1: 0, -1: 0}
+
+        super().__init__(fen)
+
+    def add_piece(self, piece):
+        super().add_piece(piece)
+
+        x, y = piece.coords
+        square = bit(x, y)
+        self.bitboards[piece.colour][piece.piece_type] |= square
+        self.occupancy[piece.colour] |= square
+
+    def remove_piece(self, piece):
+        super().remove_piece(piece)
+
+        x, y = piece.coords
+        square = bit(x, y)
+        self.bitboards[piece.colour][piece.piece_type] &= ~square
+        self.occupancy[piece.colour] &= ~square
+
+    def move_piece(self, piece, x, y):
+        old_x, old_y = piece.coords
+        super().move_piece(piece, x, y)
+
+        change = bit(old_x, old_y) | bit(x, y)
+        self.bitboards[piece.colour][piece.piece_type] ^= change
+        self.occupancy[piece.colour] ^= change
+
+    def is_attacked(self, index, colour, occupied=None, ignore=0):
+        """Returns True if the square is attacked by any piece of the given colour.
+
+        occupied replaces the real occupancy (e.g. to see through a king that is about to move)
+        and pieces on the squares in ignore don't count as attackers (e.g. a pawn taken en passant).
+        """
+        pieces = self.bitboards[colour]
+
+        if occupied is None:
+            occupied = self.occupancy[1] | self.occupancy[-1]
+
+        if KNIGHT_ATTACKS[index] & pieces["n"] & ~ignore:
+            return True
+
+        if KING_ATTACKS[index] & pieces["k"]:
+            return True
+
+        # A pawn of the attacking colour hits this square if a pawn of ours here would hit it back
+        if PAWN_ATTACKS[-colour][index] & pieces["p"] & ~ignore:
+            return True
+
+        if bishop_attacks(index, occupied) & (pieces["b"] | pieces["q"]) & ~ignore:
+            return True
+
+        if rook_attacks(index, occupied) & (pieces["r"] | pieces["q"]) & ~ignore:
+            return True
+
+        return False
+
+    def in_check(self, colour):
+        king = self.bitboards[colour]["k"]
+
+        if not king:
+            return False
+
+        return self.is_attacked(king.bit_length() - 1, -colour)
+
+    def king_safety(self, colour):
+        """Finds the pieces giving check and the pinned pieces for the king of the given colour.
+
+        Returns (king index, checkers bitboard, pins) where pins maps the square of each pinned
+        piece to the squares it may still move to (along the pin, up to and including the pinner).
+        """
+        king = self.bitboards[colour]["k"]
+        if not king:
+            return None, 0, {}
+
+        king_index = king.bit_length() - 1
+        enemy = self.bitboards[-colour]
+        own = self.occupancy[colour]
+        occupied = own | self.occupancy[-colour]
+
+        checkers = (KNIGHT_ATTACKS[king_index] & enemy["n"]) | (PAWN_ATTACKS[colour][king_index] & enemy["p"])
+        pins = {}
+
+        # Look along each line from the king through our own pieces to find the enemy sliders on it
+        diagonal_sliders = bishop_attacks(king_index, self.occupancy[-colour]) & (enemy["b"] | enemy["q"])
+        straight_sliders = rook_attacks(king_index, self.occupancy[-colour]) & (enemy["r"] | enemy["q"])
+
+        for slider in squares_of(diagonal_sliders | straight_sliders):
+            blockers = BETWEEN[king_index][slider] & occupied
+
+            if not blockers:
+                checkers |= 1 << slider
+            elif blockers & (blockers - 1) == 0 and blockers & own:
+                pins[blockers.bit_length() - 1] = BETWEEN[king_index][slider] | (1 << slider)
+
+        return king_index, checkers, pins
+
+    def en_passant_is_legal(self, colour, start, target):
+        """Plays out an en passant capture on the bitboards to check it doesn't expose the king"""
+        captured = target + 8 if colour == 1 else target - 8
+        king = self.bitboards[colour]["k"]
+
+        occupied = self.occupancy[1] | self.occupancy[-1]
+        occupied = (occupied & ~(1 << start) & ~(1 << captured)) | (1 << target)
+
+        return not self.is_attacked(king.bit_length() - 1, -colour, occupied, ignore=1 << captured)
+
+    def get_legal_move_bits(self, piece, index, king_index, checkers, pins):
+        """Filters a piece's moves down to the legal ones using the checkers and pins of the position"""
+        colour = piece.colour
+        moves = self.get_move_bits(piece)
+
+        if piece.piece_type == "k":
+            # The king can't step onto an attacked square, and mustn't hide behind itself from a slider
+            occupied = (self.occupancy[1] | self.occupancy[-1]) & ~(1 << index)
+            legal = 0
+
+            for target in squares_of(moves):
+                if self.is_attacked(target, -colour, occupied):
+                    continue
+
+                # Castling can't pass through an attacked square (castling out of check is already excluded)
+                if abs(target - index) == 2 and self.is_attacked((target + index) // 2, -colour):
+                    continue
+
+                legal |= 1 << target
+
+            return legal
+
+        # With two pieces giving check only the king can move
+        if checkers & (checkers - 1):
+            return 0
+
+        en_passant = 0
+        if piece.piece_type == "p":
+            target = self.en_passant_target()
+
+            if target is not None and moves & (1 << target):
+                # The captured pawn isn't on the target square, so check this one by playing it out
+                moves &= ~(1 << target)
+
+                if self.en_passant_is_legal(colour, index, target):
+                    en_passant = 1 << target
+
+        # In check: capture the checking piece or block the line it checks along
+        if checkers:
+            checker = checkers.bit_length() - 1
+            moves &= checkers | BETWEEN[king_index][checker]
+
+        if index in pins:
+            moves &= pins[index]
+
+        return moves | en_passant
+
+    def en_passant_target(self):
+        """Returns the square index a pawn can capture en passant onto, or None"""
+        if not self.en_passant:
+            return None
+
+        x, y = self.en_passant
+        return y * 8 + x
+
+    def get_move_bits(self, piece):
+        """Returns a bitboard of the squares a piece could move to, ignoring checks"""
+        x, y = piece.coords
+        index = y * 8 + x
+
+        colour = piece.colour
+        own = self.occupancy[colour]
+        enemy = self.occupancy[-colour]
+        occupied = own | enemy
+
+        piece_type = piece.piece_type
+
+        if piece_type == "p":
+            if colour == 1:
+                single = (1 << (index - 8)) & ~occupied if y > 0 else 0
+                double = (1 << (index - 16)) & ~occupied if single and y == 6 else 0
+            else:
+                single = (1 << (index + 8)) & ~occupied if y < 7 else 0
+                double = (1 << (index + 16)) & ~occupied if single and y == 1 else 0
+
+            attacks = PAWN_ATTACKS[colour][index]
+            moves = single | double | (attacks & enemy)
+
+            target = self.en_passant_target()
+            if target is not None and attacks & (1 << target):
+                moves |= 1 << target
+
+            return moves
+
+        if piece_type == "n":
+            return KNIGHT_ATTACKS[index] & ~own
+
+        if piece_type == "b":
+            return bishop_attacks(index, occupied) & ~own
+
+        if piece_type == "r":
+            return rook_attacks(index, occupied) & ~own
+
+        if piece_type == "q":
+            return queen_attacks(index, occupied) & ~own
+
+        moves = KING_ATTACKS[index] & ~own
+
+        # Castling follows the same rules as King.get_moves
+        if self.castling_rights and not self.in_check(colour):
+            for end_x, end_y in piece.get_castling_moves(self):
+                moves |= bit(end_x, end_y)
+
+        return moves
+
+    def get_moves(self, piece):
+        return [SQUARE_COORDS[index] for index in squares_of(self.get_move_bits(piece))]
+
+    def get_piece_legal_moves(self, piece):
+        x, y = piece.coords
+        king_index, checkers, pins = self.king_safety(piece.colour)
+        moves = self.get_legal_move_bits(piece, y * 8 + x, king_index, checkers, pins)
+
+        return [SQUARE_COORDS[index] for index in squares_of(moves)]
+
+    def generate_legal_moves(self, colour):
+        moves = []
+        squares = self.squares
+
+        # Work out the checks and pins once, then use them to filter every piece's moves
+        king_index, checkers, pins = self.king_safety(colour)
+
+        for piece_type in PIECE_TYPES:
+            for index in squares_of(self.bitboards[colour][piece_type]):
+                piece = squares[index]
+                start = piece.coords
+
+                for target in squares_of(self.get_legal_move_bits(piece, index, king_index, checkers, pins)):
+                    moves.append((start, SQUARE_COORDS[target]))
+
+        return moves
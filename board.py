@@ -1,13 +1,52 @@
 from pieces import Pawn, Knight, Bishop, Rook, Queen, King
-from utils import fen_to_coords, move_to_pgn
+from tables import piece_square_tables, zobrist_pieces, zobrist_side, zobrist_castling, zobrist_en_passant
+from tables import knight_targets, king_targets, pawn_attacks, rays, rook_directions, bishop_directions
+from utils import fen_to_coords, coords_to_notation, notation_to_coords
+
+# Castling rights are stored as bit flags
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+# Rights lost when a piece moves from or to one of these squares (the kings and rooks' starting squares)
+CASTLING_MASKS = {
+    (4, 7): WHITE_KINGSIDE | WHITE_QUEENSIDE,
+    (7, 7): WHITE_KINGSIDE,
+    (0, 7): WHITE_QUEENSIDE,
+    (4, 0): BLACK_KINGSIDE | BLACK_QUEENSIDE,
+    (7, 0): BLACK_KINGSIDE,
+    (0, 0): BLACK_QUEENSIDE
+}
+
+# FEN notation for the starting position of chess
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
 class Board:
-    def __init__(self):
+    # Piece-square tables used for the running positional score. Subclasses can swap in their own
+    # to try out different evaluations
+    square_tables = piece_square_tables
+
+    def __init__(self, fen=STARTING_FEN):
         self.pieces = []
+        self.squares = [None] * 64 # Square-indexed lookup, index = y * 8 + x
         self.history = [] # Stack to store move history
-
-        # FEN notation for the starting position of chess
-        self.setup_pieces("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR")   
+        self.zobrist_key = 0 # Hash of the position, updated with every change to the board
+
+        # Running evaluation totals from White's point of view, updated with every change to the board
+        self.material = 0
+        self.positional = 0
+
+        # State that can't be worked out from the pieces alone, saved on a stack so moves can be undone
+        self.castling_rights = 0
+        self.en_passant = None # Square a pawn can capture onto en passant, if the last move was a double step
+        self.states = []
+        self.legal_moves_cache = [] # (zobrist key, colour, moves) for each ply, so moves are only generated once per position
+        self.turn = 1 # 1 when it's White's move, -1 for Black
+        self.halfmove_clock = 0 # Plies since the last capture or pawn move, for the fifty-move rule
+        self.fullmove_number = 1 # Starts at 1 and goes up after each of Black's moves
+
+        self.setup_position(fen)
          
     def create_piece(self, piece_character, coords):
         piece_types = {
@@ -26,10 +65,193 @@ class Board:
         piece_class = piece_types[piece_type]
 
         piece = piece_class(file, rank, colour, piece_type)
-        self.pieces.append(piece)
+        self.add_piece(piece)
 
         return piece
 
+    def square_value(self, piece):
+        """The piece-square value of a piece where it stands, counted the same way as Engine.get_square_value"""
+        table = self.square_tables[piece.piece_type]
+        x, y = piece.coords
+
+        if piece.colour == 1:
+            return table[x][y]
+        else:
+            return table[7-x][y] # Mirror for Black
+
+    def add_piece(self, piece):
+        """Puts a piece on the board at its current coordinates"""
+        x, y = piece.coords
+        self.pieces.append(piece)
+        self.squares[y * 8 + x] = piece
+        self.zobrist_key ^= zobrist_pieces[piece.colour][piece.piece_type][y * 8 + x]
+
+        self.material += piece.get_value() * piece.colour
+        self.positional += self.square_value(piece)
+
+    def remove_piece(self, piece):
+        """Takes a piece off the board"""
+        x, y = piece.coords
+        self.pieces.remove(piece)
+        self.squares[y * 8 + x] = None
+        self.zobrist_key ^= zobrist_pieces[piece.colour][piece.piece_type][y * 8 + x]
+
+        self.material -= piece.get_value() * piece.colour
+        self.positional -= self.square_value(piece)
+
+    def move_piece(self, piece, x, y):
+        """Moves a piece to a new square, keeping the square lookup in sync"""
+        old_x, old_y = piece.coords
+        self.squares[old_y * 8 + old_x] = None
+        self.squares[y * 8 + x] = piece
+
+        self.positional -= self.square_value(piece)
+        piece.move(x, y)
+        self.positional += self.square_value(piece)
+
+        keys = zobrist_pieces[piece.colour][piece.piece_type]
+        self.zobrist_key ^= keys[old_y * 8 + old_x] ^ keys[y * 8 + x]
+
+    def update_state(self, castling_rights, en_passant):
+        """Changes the castling rights and en passant square, keeping the hash in sync"""
+        self.zobrist_key ^= zobrist_castling[self.castling_rights] ^ zobrist_castling[castling_rights]
+
+        if self.en_passant:
+            self.zobrist_key ^= zobrist_en_passant[self.en_passant[0]]
+        if en_passant:
+            self.zobrist_key ^= zobrist_en_passant[en_passant[0]]
+
+        self.castling_rights = castling_rights
+        self.en_passant = en_passant
+
+    def can_capture_en_passant(self, square, colour):
+        """Returns True if a pawn of the given colour stands next to the pawn that skipped over the square.
+
+        Like Polyglot, the en passant square is only recorded (and hashed) when this is true, otherwise
+        the same position would get a different key depending on whether the last move was a double step.
+        """
+        x, y = square
+        pawn_y = y + colour # The rank the double-stepped pawn landed on
+
+        for capture_x in (x - 1, x + 1):
+            if 0 <= capture_x < 8:
+                piece = self.squares[pawn_y * 8 + capture_x]
+
+                if piece and piece.piece_type == "p" and piece.colour == colour:
+                    return True
+
+        return False
+
+    def can_castle(self, colour, kingside):
+        """Returns True if the king and rook for that side haven't moved (or been captured)"""
+        if colour == 1:
+            flag = WHITE_KINGSIDE if kingside else WHITE_QUEENSIDE
+        else:
+            flag = BLACK_KINGSIDE if kingside else BLACK_QUEENSIDE
+
+        return self.castling_rights & flag != 0
+
+    def setup_position(self, fen):
+        """Set up the pieces, side to move, castling rights, en passant square and move clocks from a FEN string.
+
+        Missing fields after the piece placement take their usual defaults. Raises ValueError if the FEN is invalid.
+        """
+        fields = fen.split()
+        if not fields or len(fields) > 6:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+
+        self.setup_pieces(fields[0])
+
+        turn = fields[1] if len(fields) > 1 else "w"
+        if turn not in ("w", "b"):
+            raise ValueError(f"Invalid side to move in FEN: {turn!r}")
+
+        if turn == "b":
+            self.turn = -1
+            self.zobrist_key ^= zobrist_side
+
+        castling_rights = 0
+        if len(fields) > 2 and fields[2] != "-":
+            flags = {"K": WHITE_KINGSIDE, "Q": WHITE_QUEENSIDE, "k": BLACK_KINGSIDE, "q": BLACK_QUEENSIDE}
+
+            for character in fields[2]:
+                if character not in flags:
+                    raise ValueError(f"Invalid castling rights in FEN: {fields[2]!r}")
+
+                castling_rights |= flags[character]
+
+        en_passant = None
+        if len(fields) > 3 and fields[3] != "-":
+            square = fields[3]
+
+            if len(square) != 2 or square[0] not in "abcdefgh" or square[1] not in "36":
+                raise ValueError(f"Invalid en passant square in FEN: {square!r}")
+
+            en_passant = notation_to_coords(square)
+
+            # Dropped like after a move if no pawn could take, so the key matches the same position reached by moving
+            if not self.can_capture_en_passant(en_passant, 1 if turn == "w" else -1):
+                en_passant = None
+
+        self.update_state(castling_rights, en_passant)
+
+        try:
+            self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Invalid move clocks in FEN: {fen!r}") from None
+
+    def to_fen(self):
+        """Returns the position as a FEN string"""
+        return f"{self.to_epd()} {self.halfmove_clock} {self.fullmove_number}"
+
+    def to_epd(self, operations=None):
+        """Returns the position as an EPD string: the first four FEN fields, then any operations given as a dict.
+
+        String operands are quoted, lists are written space separated (e.g. {"bm": ["Nf3"], "id": "test 1"}).
+        """
+        ranks = []
+
+        for y in range(8):
+            rank = ""
+            empty = 0
+
+            for x in range(8):
+                piece = self.squares[y * 8 + x]
+
+                if not piece:
+                    empty += 1
+                    continue
+
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+
+                rank += piece.piece_type.upper() if piece.colour == 1 else piece.piece_type
+
+            if empty:
+                rank += str(empty)
+
+            ranks.append(rank)
+
+        flags = (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+        castling = "".join(character for character, flag in flags if self.castling_rights & flag) or "-"
+
+        en_passant = coords_to_notation(self.en_passant) if self.en_passant else "-"
+        turn = "w" if self.turn == 1 else "b"
+
+        epd = f"{'/'.join(ranks)} {turn} {castling} {en_passant}"
+
+        for opcode, operand in (operations or {}).items():
+            if isinstance(operand, (list, tuple)):
+                operand = " ".join(str(value) for value in operand)
+            elif isinstance(operand, str):
+                operand = f'"{operand}"'
+
+            epd += f" {opcode} {operand};"
+
+        return epd
+
     def setup_pieces(self, fen):
         """Set up the pieces in their starting positions"""
         piece_coords = fen_to_coords(fen)
@@ -40,11 +262,74 @@ class Board:
 
     def get_piece_at(self, x, y):
         """Returns the piece at a given (x, y) coordinate"""
-        for piece in self.pieces:
-            if piece.coords[0] == x and piece.coords[1] == y:
-                return piece
-            
+        return self.squares[y * 8 + x]
+
+    def get_moves(self, piece):
+        """Returns the squares a piece could move to, ignoring checks"""
+        return piece.get_moves(self)
+
+    def get_piece_legal_moves(self, piece):
+        """Returns the squares a piece can move to without leaving its king in check"""
+        legal_moves = []
+
+        for end in self.get_moves(piece):
+            if self.causes_check((piece.coords, end), piece.colour):
+                continue
+
+            # A castling king can't pass through an attacked square either
+            if piece.piece_type == "k" and abs(end[0] - piece.coords[0]) == 2:
+                passing = ((piece.coords[0] + end[0]) // 2, end[1])
+
+                if self.causes_check((piece.coords, passing), piece.colour):
+                    continue
+
+            legal_moves.append(end)
+
+        return legal_moves
+
+    def get_legal_moves(self, colour):
+        """Returns every legal (start, end) move for the given colour.
+
+        The list is cached for the current position until another position is reached at the same ply,
+        so it mustn't be changed by the caller.
+        """
+        moves = self.cached_legal_moves(colour)
+
+        if moves is None:
+            ply = len(self.history)
+            cache = self.legal_moves_cache
+
+            if ply >= len(cache):
+                cache.extend([None] * (ply + 1 - len(cache)))
+
+            moves = self.generate_legal_moves(colour)
+            cache[ply] = (self.zobrist_key, colour, moves)
+
+        return moves
+
+    def cached_legal_moves(self, colour):
+        """The legal moves for the current position if they've already been worked out, otherwise None"""
+        ply = len(self.history)
+
+        if ply < len(self.legal_moves_cache) and self.legal_moves_cache[ply]:
+            key, cached_colour, moves = self.legal_moves_cache[ply]
+
+            if key == self.zobrist_key and cached_colour == colour:
+                return moves
+
         return None
+
+    def generate_legal_moves(self, colour):
+        """Works out every legal (start, end) move for the given colour"""
+        moves = []
+
+        # Copy the list since make/unmake reorder the pieces while we test each move
+        for piece in list(self.pieces):
+            if piece.colour == colour:
+                for end in self.get_piece_legal_moves(piece):
+                    moves.append((piece.coords, end))
+
+        return moves
     
     def promote(self, piece, start, end, captured_piece):
         # Promote Pawn to Queen automatically if possible
@@ -54,7 +339,7 @@ class Board:
 
         if white_promote or black_promote:
             # Remove the Pawn and replace with a Queen at the same position
-            self.pieces.remove(piece)
+            self.remove_piece(piece)
 
             piece_type = "Q" if piece.colour == 1 else "q"
             promoted_piece = self.create_piece(piece_type, piece.coords)
@@ -73,23 +358,35 @@ class Board:
         if not king:
             return False # Shouldn't happen, but just in case
 
-        # Check if any opponent's piece can attack the king
-        for piece in self.pieces:
-            if piece.colour != colour:
-                # Avoid recursion by not asking the King for its own moves
-                if piece.piece_type == "k":
-                    # Manually check if the opponent king is adjacent
-                    # Kings cannot attack each other directly
-                    x, y = king.coords
-                    px, py = piece.coords
+        x, y = king.coords
+        index = y * 8 + x
+        squares = self.squares
+
+        def attacked_from(targets, piece_types):
+            for target in targets:
+                piece = squares[target]
+                if piece and piece.colour != colour and piece.piece_type in piece_types:
+                    return True
+            return False
 
-                    if abs(x - px) <= 1 and abs(y - py) <= 1:
-                        return True
+        # Look outwards from the king for each kind of attacker. A pawn attacks the king from the
+        # squares a pawn of the king's own colour would attack
+        if attacked_from(knight_targets[index], "n") or attacked_from(king_targets[index], "k"):
+            return True
 
-                    continue # Skip further processing for opponent's King
+        if attacked_from(pawn_attacks[colour][index], "p"):
+            return True
 
-                if king.coords in piece.get_moves(self):
-                    return True # King is in check
+        # Sliding pieces: only the first piece along each ray can attack
+        for directions, piece_types in ((rook_directions, "rq"), (bishop_directions, "bq")):
+            for direction in directions:
+                for target in rays[direction][index]:
+                    piece = squares[target]
+
+                    if piece:
+                        if piece.colour != colour and piece.piece_type in piece_types:
+                            return True
+                        break
 
         return False
 
@@ -104,52 +401,53 @@ class Board:
     
     def is_checkmate(self, colour):
         """Returns True if the given colour is in checkmate"""
-        if not self.in_check(colour):
-            return False
-
-        # Check if any move can get the player out of check
-        for piece in self.pieces:
-            if piece.colour == colour:
-                for end in piece.get_moves(self):
-                    move = (piece.coords, end)
-                    check = self.causes_check(move, colour)
-
-                    if not check:
-                        return False # The player can escape check
-
-        return True # No escape moves = Checkmate
+        return self.in_check(colour) and not self.get_legal_moves(colour)
     
     def is_stalemate(self, colour):
         """Returns True if the game is in stalemate (no legal moves but not in check)"""
-        if self.in_check(colour):
-            return False # It's check, not stalemate
-
-        # Check if there are any legal moves left
-        for piece in self.pieces:
-            if piece.colour == colour:
-                for end in piece.get_moves(self):
-                    move = (piece.coords, end)
-                    check = self.causes_check(move, colour)
-
-                    if not check:
-                        return False # The player has at least one move
-
-        return True # No legal moves left = Stalemate
+        return not self.in_check(colour) and not self.get_legal_moves(colour)
 
     def make_move(self, start, end):
         """Updates the board with the move and stores it in history"""
         piece = self.get_piece_at(start[0], start[1])
-        is_legal = end in piece.get_moves(self)
+
+        # Anything in the cached legal moves can be played straight away. Otherwise fall back to the
+        # piece's own moves, since checking for checks plays moves that might leave the king attacked
+        is_legal = piece is not None and ((start, end) in (self.cached_legal_moves(piece.colour) or ()) or end in self.get_moves(piece))
 
         if piece and is_legal:
             captured_piece = self.get_piece_at(end[0], end[1])
 
+            # En passant: a pawn moving diagonally onto an empty square takes the pawn beside it
+            if piece.piece_type == "p" and start[0] != end[0] and not captured_piece:
+                captured_piece = self.get_piece_at(end[0], start[1])
+
             if captured_piece:
-                self.pieces.remove(captured_piece)
+                self.remove_piece(captured_piece)
 
             move = (start, end, piece, captured_piece, None)
             self.history.append(move)
-            piece.move(end[0], end[1])
+            self.states.append((self.castling_rights, self.en_passant, self.halfmove_clock))
+            self.move_piece(piece, end[0], end[1])
+            self.zobrist_key ^= zobrist_side
+            self.turn = -self.turn
+
+            self.halfmove_clock = 0 if piece.piece_type == "p" or captured_piece else self.halfmove_clock + 1
+            if piece.colour == -1:
+                self.fullmove_number += 1
+
+            # Moving a king or rook, or capturing a rook, loses the matching castling rights
+            castling_rights = self.castling_rights & ~(CASTLING_MASKS.get(start, 0) | CASTLING_MASKS.get(end, 0))
+
+            # A pawn double step can be captured en passant on the square it skipped over
+            en_passant = None
+            if piece.piece_type == "p" and abs(start[1] - end[1]) == 2:
+                en_passant = (start[0], (start[1] + end[1]) // 2)
+
+                if not self.can_capture_en_passant(en_passant, -piece.colour):
+                    en_passant = None
+
+            self.update_state(castling_rights, en_passant)
 
             # Attempt to promote the piece if it's a pawn
             if piece.piece_type == "p":
@@ -169,43 +467,70 @@ class Board:
         if x == 6: # Kingside
             rook = self.get_piece_at(7, y)
             if rook:
-                rook.move(5, y)
+                self.move_piece(rook, 5, y)
 
         elif x == 2: # Queenside
             rook = self.get_piece_at(0, y)
             if rook:
-                rook.move(3, y)
+                self.move_piece(rook, 3, y)
         
+    def make_null_move(self):
+        """Passes the turn without moving a piece, for null-move pruning. Undone with unmake_move"""
+        self.history.append(None)
+        self.states.append((self.castling_rights, self.en_passant, self.halfmove_clock))
+        self.zobrist_key ^= zobrist_side
+        self.turn = -self.turn
+
+        self.update_state(self.castling_rights, None) # Passing gives up any en passant capture
+
     def unmake_move(self):
         """Reverts the last move"""
         if not self.history:
             return
+
+        if self.history[-1] is None:
+            # Undo a null move, which only changed the state
+            self.history.pop()
+            self.zobrist_key ^= zobrist_side
+            self.turn = -self.turn
+
+            castling_rights, en_passant, self.halfmove_clock = self.states.pop()
+            self.update_state(castling_rights, en_passant)
+            return
         
         start, end, piece, captured_piece, promoted_piece = self.history.pop()
+        self.zobrist_key ^= zobrist_side
+        self.turn = -self.turn
+
+        castling_rights, en_passant, self.halfmove_clock = self.states.pop()
+        self.update_state(castling_rights, en_passant)
+
+        if piece.colour == -1:
+            self.fullmove_number -= 1
 
         # If the move was a promotion, remove the queen and restore the pawn
         if promoted_piece:
             old_pawn = self.get_piece_at(end[0], end[1])
 
             if old_pawn:
-                self.pieces.remove(old_pawn)
+                self.remove_piece(old_pawn)
 
-            self.pieces.append(piece)
+            # The pawn still holds its end coordinates, so it goes back on that square first
+            self.add_piece(piece)
 
         # Undo castling
         if piece.piece_type == "k" and abs(start[0] - end[0]) == 2:
             y = start[1]
 
             if end[0] == 6: # Kingside castling
-                self.get_piece_at(5, y).move(7, y) 
+                self.move_piece(self.get_piece_at(5, y), 7, y)
 
             elif end[0] == 2: # Queenside castling
-                self.get_piece_at(3, y).move(0, y)
+                self.move_piece(self.get_piece_at(3, y), 0, y)
 
         # Revert the piece position
-        piece.move(start[0], start[1])
+        self.move_piece(piece, start[0], start[1])
 
-        # Restore captured piece
+        # Restore captured piece (it still holds its coordinates, which differ from end for en passant)
         if captured_piece:
-            self.pieces.append(captured_piece)
-            captured_piece.move(end[0], end[1])
\ No newline at end of file
+            self.add_piece(captured_piece)
\ No newline at end of file
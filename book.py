@@ -0,0 +1,128 @@
+import argparse
+import mmap
+import random
+import struct
+
+from bitboard import BitBoard
+from utils import read_pgn_games, pgn_to_move
+
+# Each entry has the same layout as a Polyglot book entry: a 64-bit position hash, a 16-bit move,
+# a 16-bit weight and 32 unused bits. Entries are sorted by hash so a position can be found with a
+# binary search. The hash is Board.zobrist_key rather than the Polyglot hash, so books have to be
+# built with the builder below.
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+
+MAX_WEIGHT = 65535
+
+def encode_move(move):
+    """Packs a (start, end) move into 16 bits: 6 bits per square index"""
+    (start_x, start_y), (end_x, end_y) = move
+    return (start_y * 8 + start_x) << 6 | (end_y * 8 + end_x)
+
+def decode_move(code):
+    start = code >> 6
+    end = code & 63
+
+    return (start % 8, start // 8), (end % 8, end // 8)
+
+class OpeningBook:
+    """Looks up book moves in a memory-mapped book file"""
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = 0
+        self.data = None
+
+        # An empty file can't be memory-mapped, but it's still a valid (empty) book
+        length = self.file.seek(0, 2)
+        if length:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = length // ENTRY.size
+
+    def close(self):
+        if self.data:
+            self.data.close()
+
+        self.file.close()
+
+    def get_moves(self, key):
+        """Returns a list of (move, weight) stored for a position hash"""
+        # Binary search for the first entry with this key
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        for index in range(low, self.size):
+            entry_key, code, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+
+            if entry_key != key:
+                break
+
+            moves.append((decode_move(code), weight))
+
+        return moves
+
+    def choose_move(self, board, colour):
+        """Picks one of the book moves for the position at random, favouring the higher weights"""
+        legal_moves = board.get_legal_moves(colour)
+        moves = [(move, weight) for move, weight in self.get_moves(board.zobrist_key) if move in legal_moves and weight > 0]
+
+        if not moves:
+            return None
+
+        return random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+def build_book(pgn_paths, output_path, max_ply=20):
+    """Compiles a book from PGN files, weighting each move by the results of the games it was played in.
+
+    A move scores 2 for every win by the side that played it and 1 for every draw. Games without a
+    result count as draws. Returns the number of entries written.
+    """
+    weights = {}
+    result_points = {"1-0": {1: 2, -1: 0}, "0-1": {1: 0, -1: 2}}
+
+    for path in pgn_paths:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for headers, moves in read_pgn_games(file):
+                points = result_points.get(headers.get("Result"), {1: 1, -1: 1})
+
+                board = BitBoard(headers["FEN"]) if "FEN" in headers else BitBoard()
+                colour = board.turn
+
+                for san in moves[:max_ply]:
+                    move = pgn_to_move(board, san, colour)
+
+                    if not move:
+                        break # Illegal or unsupported move, skip the rest of the game
+
+                    if points[colour]:
+                        entry = (board.zobrist_key, encode_move(move))
+                        weights[entry] = weights.get(entry, 0) + points[colour]
+
+                    board.make_move(*move)
+                    colour = -colour
+
+    with open(output_path, "wb") as file:
+        for (key, code), weight in sorted(weights.items(), key=lambda item: (item[0][0], -item[1])):
+            file.write(ENTRY.pack(key, code, min(weight, MAX_WEIGHT), 0))
+
+    return len(weights)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files")
+    parser.add_argument("pgn", nargs="+", help="PGN files to read games from")
+    parser.add_argument("-o", "--output", default="book.bin")
+    parser.add_argument("--max-ply", type=int, default=20, help="how many moves into each game to read")
+    args = parser.parse_args()
+
+    entries = build_book(args.pgn, args.output, args.max_ply)
+    print(f"Wrote {entries} entries to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,120 @@
+import time
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from bitbase import Bitbases, DRAW, LOSS, WIN
+from stats import SearchStats, profile_search
 from tables import piece_square_tables
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+# Expected number of moves left in the game when splitting up the remaining time
+MOVES_TO_GO = 30
+
+# Score for delivering checkmate, well above any material total (both kings are always on the board)
+MATE_SCORE = 1000000000
+
+# Score for a position the bitbases say is won, above any material total but below a found mate
+KNOWN_WIN = 100000
+
+# Piece values for ordering captures, most valuable victim first and then least valuable attacker
+ORDER_VALUES = {"p": 1, "n": 3, "b": 3, "r": 5, "q": 9, "k": 10}
+
+# Ordering scores for each kind of move, from first searched to last
+HASH_MOVE_SCORE = 10000000
+CAPTURE_SCORE = 1000000
+KILLER_SCORES = (900000, 800000)
+HISTORY_LIMIT = 500000 # History scores are halved once one reaches this, so they stay below the killers
+
+# Quiescence search limits
+QUIESCENCE_BUDGET = 2000 # Most nodes searched past the horizon from one leaf
+DELTA_MARGIN = 200 # A capture is skipped if winning the piece plus this still can't reach alpha
+PROMOTION_GAIN = 800 # Material gained by promoting a pawn to a queen
+
+# Null-move pruning: if passing the turn still fails high at this much less depth, the real moves will too
+NULL_MOVE_REDUCTION = 2
+
+# Late move reductions: quiet moves ordered after the first few are searched one ply shallower first
+LMR_FIRST_MOVES = 3 # Moves searched at full depth before any are reduced
+LMR_MIN_DEPTH = 3
+
+# Aspiration windows: each iteration first searches this close to the last one's score, and a score
+# outside the window makes that side of it four times wider until it stops being a limit at all
+ASPIRATION_WINDOW = 50
+ASPIRATION_LIMIT = 3200
+ASPIRATION_MIN_DEPTH = 4 # Scores at shallower depths jump around too much to be worth guessing
+
+STOP_POLL_INTERVAL = 0.05 # Seconds between checks for a stop while waiting on the worker processes
+
+def score_to_table(score, ply):
+    """Mate scores count plies from the root, but a stored position can be reached at any ply and in
+    later searches, so mates are stored counting from the position itself instead
+    """
+    if score > MATE_SCORE - 1000:
+        return score + ply
+    elif score < -(MATE_SCORE - 1000):
+        return score - ply
+
+    return score
+
+def score_from_table(score, ply):
+    """Turns a stored mate score back into one counting plies from the root"""
+    if score > MATE_SCORE - 1000:
+        return score - ply
+    elif score < -(MATE_SCORE - 1000):
+        return score + ply
+
+    return score
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the hard deadline has passed"""
 
 class Engine:
-    def __init__(self, depth):
+    def __init__(self, depth, hash_size=16, workers=1, book=None, bitbases=None, profile=None, profile_path="profile.txt",
+                 null_move=True, late_move_reductions=True):
         self.MAX_DEPTH = depth
         self.ALPHA = float("-inf")
         self.BETA = float("inf")
 
+        # Search options, both can be turned off to compare against a full-width search
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+
+        # Kept for the whole game so positions searched on earlier moves are remembered
+        self.table = TranspositionTable(hash_size)
+
+        # Worker processes for searching root moves in parallel, started the first time they're needed
+        self.hash_size = hash_size
+        self.workers = workers
+        self.pool = None
+
+        self.book = book # Opening book checked before searching, if there is one
+        self.bitbases = bitbases # Known results for simple endgames, used instead of searching them
+
+        self.pv = [] # Principal variation from the last completed iteration
+        self.pv_table = [] # Best line found so far from each ply of the current iteration
+        self.root_ply = 0
+        self.soft_deadline = None # Don't start another iteration after this
+        self.hard_deadline = None # Abandon the current iteration after this
+
+        # Searching the expected reply on the player's time
+        self.ponder_thread = None
+        self.ponder_key = None # Zobrist key of the position being pondered
+        self.ponder_move = None # Best move found by the ponder search so far
+        self.stopped = False # Set to abandon the current search straight away
+
+        self.stats = SearchStats() # Counters for the current search
+        self.node_limit = None # Abandon the search after visiting this many positions
+        self.on_iteration = None # Called with (depth, score, stats) after each completed iteration
+
+        # Set to "cpu" or "memory" to profile every search, appending the reports to profile_path
+        self.profile = profile
+        self.profile_path = profile_path
+
+        self.killers = [] # Two quiet moves per ply that recently caused a cutoff
+        self.quiescence_nodes_left = 0
+        self.history_scores = {1: {}, -1: {}} # Butterfly table: how often each (start, end) move caused a cutoff
+
     def get_square_value(self, piece):
         """Retrieve the piece-square value for a given piece"""
         table = piece_square_tables[piece.piece_type]
@@ -17,15 +126,15 @@ class Engine:
             return table[7-x][y] # Mirror for Black
 
     def evaluate_board(self, board, colour):
-        if board.is_checkmate(colour):
-            return float("-inf") * colour
-        
-        if board.is_checkmate(-colour):
-            return float("inf") * colour
+        """Material and piece-square score from the side to move's point of view.
 
-        if board.is_stalemate(colour) or board.is_stalemate(-colour):
-            return 0
+        The board keeps these totals up to date as moves are made, so this doesn't look at any pieces.
+        Checkmate and stalemate are found by the search when a position has no legal moves.
+        """
+        return (board.material + board.positional) * colour
 
+    def count_board(self, board, colour):
+        """Works out the same score as evaluate_board from scratch by visiting every piece"""
         score = 0
 
         for piece in board.pieces:
@@ -40,20 +149,129 @@ class Engine:
 
     def negamax(self, board, depth, alpha, beta, colour):
         """Negamax algorithm with alpha-beta pruning"""
-        if depth == 0 or board.is_checkmate(colour):
-            return self.evaluate_board(board, colour), None
+        self.stats.nodes += 1
+
+        if self.stopped or (self.hard_deadline and time.perf_counter() > self.hard_deadline):
+            raise SearchTimeout
+
+        if self.node_limit and self.stats.nodes > self.node_limit:
+            raise SearchTimeout
+
+        # Forget the line found by the last node at this ply, so the parent only sees this node's
+        ply = len(board.history) - self.root_ply
+        while len(self.pv_table) <= ply:
+            self.pv_table.append([])
+        self.pv_table[ply] = []
+
+        original_alpha = alpha
+        key = board.zobrist_key
+        hash_move = None
+
+        # Use a stored result if it was searched at least as deep as we need
+        entry = self.table.probe(key)
+        self.stats.table_probes += 1
+
+        if entry:
+            self.stats.table_hits += 1
+            entry_depth, entry_score, flag, hash_move = entry
+            entry_score = score_from_table(entry_score, ply)
+
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return entry_score, hash_move
+                elif flag == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                elif flag == UPPER_BOUND:
+                    beta = min(beta, entry_score)
+
+                if alpha >= beta:
+                    return entry_score, hash_move
+
+        # Follow the previous iteration's principal variation if there's no stored move
+        if hash_move is None and 0 <= ply < len(self.pv):
+            hash_move = self.pv[ply]
+
+        # Endgames covered by the bitbases have a known result. Draws need no search at all, while won
+        # positions are only searched to find the quickest way through, scored by the bitbase at the leaves
+        if self.bitbases and ply > 0 and len(board.pieces) <= 3:
+            result = self.bitbases.probe(board, colour)
+            self.stats.bitbase_probes += 1
+
+            if result is not None:
+                self.stats.bitbase_hits += 1
+
+            if result == DRAW:
+                return 0, None
+
+            if result is not None and depth == 0:
+                # Still tell checkmate apart from a lost position with moves left
+                if result == LOSS and board.in_check(colour) and not board.get_legal_moves(colour):
+                    return -(MATE_SCORE - ply), None
+
+                return self.bitbase_score(board, colour, result), None
+
+        # Keep going through captures at the horizon so the score isn't taken in the middle of an exchange
+        if depth == 0:
+            self.quiescence_nodes_left = QUIESCENCE_BUDGET
+            return self.quiescence(board, alpha, beta, colour, ply), None
+
+        in_check = board.in_check(colour)
+
+        # Null-move pruning: let the opponent move twice, and if we're still above beta with a shallower
+        # search then a real move would be too. Not done in check, twice in a row, or with only pawns
+        # left, where passing could be better than any move (zugzwang)
+        if (
+            self.null_move and ply > 0 and depth > NULL_MOVE_REDUCTION and not in_check
+            and beta < MATE_SCORE - 1000 and board.history[-1] is not None
+            and self.has_pieces(board, colour) and self.evaluate_board(board, colour) >= beta
+        ):
+            board.make_null_move()
+
+            try:
+                score = -self.negamax(board, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, -colour)[0]
+            finally:
+                board.unmake_move()
+
+            if score >= beta:
+                return beta, None # A mate found after passing can't be trusted, so just report the bound
 
         best_score = float("-inf")
         best_move = None
 
-        sorted_moves = self.sorted_moves(board, colour) # Generate legal moves for the current player
+        sorted_moves = self.sorted_moves(board, colour, hash_move, ply) # Generate legal moves for the current player
+
+        # No legal moves means the game is over: checkmate if we're in check, otherwise stalemate
+        if not sorted_moves:
+            if in_check:
+                return -(MATE_SCORE - ply), None # Prefer the quickest mate and the slowest loss
+
+            return 0, None
+
+        killers = self.killers[ply] if ply < len(self.killers) else ()
         
-        for move in sorted_moves:
+        for index, move in enumerate(sorted_moves):
             start, end = move
+            quiet = self.is_quiet(board, move) and move not in killers
             board.make_move(start, end)
 
-            score, _ = self.negamax(board, depth - 1, -beta, -alpha, -colour)
-            score = -score
+            if index == 0:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, -colour)[0]
+            else:
+                # Principal variation search: with good ordering the first move is the best one, so the
+                # rest only need a null-window search proving they can't beat it. Late move reductions
+                # also search quiet moves this far down the ordering one ply shallower at first
+                reduced = (
+                    self.late_move_reductions and index >= LMR_FIRST_MOVES and depth >= LMR_MIN_DEPTH
+                    and quiet and not in_check and not board.in_check(-colour)
+                )
+                score = -self.negamax(board, depth - 2 if reduced else depth - 1, -alpha - 1, -alpha, -colour)[0]
+
+                # A move that beats alpha after all is searched again, at full depth, then with the full window
+                if reduced and score > alpha:
+                    score = -self.negamax(board, depth - 1, -alpha - 1, -alpha, -colour)[0]
+
+                if alpha < score < beta:
+                    score = -self.negamax(board, depth - 1, -beta, -alpha, -colour)[0]
 
             board.unmake_move() 
 
@@ -61,39 +279,569 @@ class Engine:
                 best_score = score
                 best_move = move
 
+            if score > alpha:
+                self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+
             alpha = max(alpha, score)
 
             # Alpha-beta pruning
             if alpha >= beta:
+                self.stats.cutoffs += 1
+                if index == 0:
+                    self.stats.first_move_cutoffs += 1
+
+                if not board.get_piece_at(end[0], end[1]):
+                    self.record_cutoff(move, colour, depth, ply)
                 break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+
+        self.table.store(key, depth, score_to_table(best_score, ply), flag, best_move)
         
         return best_score, best_move
 
-    def sorted_moves(self, board, colour):
-        """Orders moves so captures are considered before other moves"""
-        moves = []
+    def has_pieces(self, board, colour):
+        """Returns True if a side has anything other than its king and pawns"""
+        for piece in board.pieces:
+            if piece.colour == colour and piece.piece_type in "nbrq":
+                return True
+
+        return False
+
+    def is_quiet(self, board, move):
+        """Returns True if a move isn't a capture (including en passant) or a promotion"""
+        start, end = move
+
+        if board.get_piece_at(end[0], end[1]):
+            return False
 
-        captures = []
-        checks = []
+        piece = board.get_piece_at(start[0], start[1])
+        return piece.piece_type != "p" or (start[0] == end[0] and end[1] not in (0, 7))
 
+    def bitbase_score(self, board, colour, result):
+        """Scores a bitbase result, adding a bonus that helps the winning side make progress"""
+        if result == DRAW:
+            return 0
+
+        strong = colour if result == WIN else -colour
+        kings = {piece.colour: piece.coords for piece in board.pieces if piece.piece_type == "k"}
+        (strong_x, strong_y), (weak_x, weak_y) = kings[strong], kings[-strong]
+
+        # Drive the lone king towards the edge and bring the winning king closer to it
+        progress = 10 * (abs(2 * weak_x - 7) + abs(2 * weak_y - 7)) - 4 * (abs(strong_x - weak_x) + abs(strong_y - weak_y))
+
+        # Take squares away from the lone king
+        weak_king = board.get_piece_at(weak_x, weak_y)
+        progress -= 10 * len(board.get_piece_legal_moves(weak_king))
+
+        # Push the pawn, and count material so that promoting is always an improvement
         for piece in board.pieces:
-            if piece.colour != colour:
-                continue # Ignore other player's pieces
+            if piece.piece_type == "p":
+                progress += 20 * (6 - piece.coords[1] if strong == 1 else piece.coords[1] - 1)
+
+        progress += board.material * strong
+
+        return (KNOWN_WIN + progress) * result
+
+    def quiescence(self, board, alpha, beta, colour, ply):
+        """Searches only captures and promotions until the position is quiet"""
+        self.quiescence_nodes_left -= 1
+        self.stats.nodes += 1
+        self.stats.quiescence_nodes += 1
+        in_check = board.in_check(colour)
+
+        # When in check every move has to be considered, otherwise the side to move can choose to
+        # stop capturing and "stand pat" with the current evaluation
+        if in_check:
+            stand_pat = float("-inf")
+        else:
+            stand_pat = self.evaluate_board(board, colour)
+
+            if stand_pat >= beta or self.quiescence_nodes_left <= 0:
+                return stand_pat
+
+            # Delta pruning: even winning a queen (900) and promoting wouldn't be enough to catch up
+            if stand_pat + 900 + PROMOTION_GAIN + DELTA_MARGIN < alpha:
+                return stand_pat
+
+            alpha = max(alpha, stand_pat)
+
+        moves = self.sorted_moves(board, colour, ply=ply)
+
+        # No legal moves is checkmate or stalemate, which the material count doesn't know about
+        if not moves:
+            if in_check:
+                return -(MATE_SCORE - ply)
+
+            return 0
+
+        best_score = stand_pat
+
+        for start, end in moves:
+            piece = board.get_piece_at(start[0], start[1])
+            victim = board.get_piece_at(end[0], end[1])
+            promotion = piece.piece_type == "p" and end[1] in (0, 7)
+            en_passant = piece.piece_type == "p" and start[0] != end[0] and not victim
+
+            if not in_check:
+                if not (victim or promotion or en_passant):
+                    continue
+
+                # Delta pruning: skip captures that can't raise the score to alpha
+                gain = victim.get_value() if victim else 100
+                if promotion:
+                    gain += PROMOTION_GAIN
+
+                if stand_pat + gain + DELTA_MARGIN < alpha:
+                    continue
+
+            board.make_move(start, end)
+            score = -self.quiescence(board, -beta, -alpha, -colour, ply + 1)
+            board.unmake_move()
+
+            if score > best_score:
+                best_score = score
+
+            alpha = max(alpha, score)
+
+            if alpha >= beta:
+                break
+
+        return best_score
+
+    def sorted_moves(self, board, colour, hash_move=None, ply=0):
+        """Orders moves so the ones most likely to cause a cutoff are searched first.
+
+        That is the stored best move, then captures (most valuable victim, least valuable attacker),
+        then the killer moves for this ply, then other moves by their history score.
+        """
+        moves = board.get_legal_moves(colour)
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history_scores[colour]
+        get_piece_at = board.get_piece_at
+
+        scores = {}
+
+        for move in moves:
+            if move == hash_move:
+                scores[move] = HASH_MOVE_SCORE
+                continue
+
+            start, end = move
+            victim = get_piece_at(end[0], end[1])
+
+            if victim:
+                attacker = get_piece_at(start[0], start[1])
+                scores[move] = CAPTURE_SCORE + ORDER_VALUES[victim.piece_type] * 10 - ORDER_VALUES[attacker.piece_type]
+            elif move in killers:
+                scores[move] = KILLER_SCORES[killers.index(move)]
+            else:
+                scores[move] = history.get(move, 0)
+
+        # Sorted into a new list, since the board keeps the one it returned
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def record_cutoff(self, move, colour, depth, ply):
+        """Remembers a quiet move that caused a beta cutoff, as a killer and in the history table"""
+        while len(self.killers) <= ply:
+            self.killers.append([])
+
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+
+        history = self.history_scores[colour]
+        history[move] = history.get(move, 0) + depth * depth
+
+        if history[move] >= HISTORY_LIMIT:
+            for key in history:
+                history[key] //= 2
+
+    def allocate_time(self, time_left):
+        """Splits the remaining clock time into a soft and a hard deadline for one move"""
+        soft = time_left / MOVES_TO_GO
+        hard = min(soft * 4, time_left / 4)
+
+        return soft, hard
+
+    def get_pv(self, board, colour, depth, line=()):
+        """Plays through a line of moves, then carries it on up to depth moves with the best moves stored
+        in the transposition table, since a line cut short by a table hit doesn't reach the end of the search
+        """
+        pv = []
+
+        for move in line[:depth]:
+            if not board.make_move(*move):
+                break
+
+            pv.append(move)
+            colour = -colour
+
+        for _ in range(depth - len(pv)):
+            entry = self.table.probe(board.zobrist_key)
+
+            if not entry or entry[3] is None:
+                break
+
+            if not board.make_move(*entry[3]):
+                break
+
+            pv.append(entry[3])
+            colour = -colour
+
+        for _ in pv:
+            board.unmake_move()
+
+        return pv
+
+    def begin_search(self, board, time_limit=None):
+        """Resets the per-search state before searching from the given position"""
+        self.table.new_search()
+        self.pv = []
+        self.pv_table = []
+        self.root_ply = len(board.history)
+        self.killers = []
+        self.stats = SearchStats()
+        self.soft_deadline = None
+        self.hard_deadline = None
+
+        if time_limit is not None:
+            self.hard_deadline = time.perf_counter() + time_limit
+
+        # Keep what history learned from the last move, but let newer results count for more
+        for history in self.history_scores.values():
+            for key in history:
+                history[key] //= 2
+
+    def get_pool(self):
+        if self.pool is None:
+            # Spawn rather than fork, since the GUI runs the search from a thread
+            context = multiprocessing.get_context("spawn")
+            bitbase_directory = self.bitbases.directory if self.bitbases else None
+            options = (self.null_move, self.late_move_reductions)
+
+            # Bumped whenever a root search ends, telling the workers to abandon any of its moves they're still on
+            self.search_generation = context.RawValue("i", 0)
+
+            self.pool = ProcessPoolExecutor(
+                self.workers, context, init_worker,
+                (self.MAX_DEPTH, self.hash_size, bitbase_directory, options, self.search_generation)
+            )
+
+        return self.pool
+
+    def close(self):
+        """Stops pondering and shuts down the worker processes, if any were started"""
+        self.stop_pondering()
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def parallel_root_search(self, board, depth, alpha, beta, colour):
+        """Searches the root moves across the worker processes.
+
+        The first move is searched here to get a score to beat, then every other move is sent to the
+        workers as a FEN string with a null window around that score. Moves that beat it are searched
+        again here with the rest of the window.
+        """
+        moves = self.sorted_moves(board, colour, self.pv[0] if self.pv else None)
+
+        if not moves or depth == 1:
+            return self.negamax(board, depth, alpha, beta, colour)
+
+        key = board.zobrist_key
+        original_alpha = alpha
+        best_move = moves[0]
+
+        board.make_move(*best_move)
+        best_score = -self.negamax(board, depth - 1, -beta, -alpha, -colour)[0]
+        board.unmake_move()
+
+        self.pv_table[0] = [best_move] # The rest of the line is read back from the transposition table
+
+        if best_score >= beta:
+            self.table.store(key, depth, best_score, LOWER_BOUND, best_move)
+            return best_score, best_move
+
+        alpha = max(alpha, best_score)
+
+        # perf_counter can't be compared between processes, so the workers get the deadline as a wall clock time
+        deadline = None
+        if self.hard_deadline:
+            deadline = time.time() + (self.hard_deadline - time.perf_counter())
+
+        futures = {}
+        pool = self.get_pool()
+        generation = self.search_generation.value
+
+        for move in moves[1:]:
+            board.make_move(*move)
+            fen = board.to_fen()
+            board.unmake_move()
+
+            future = pool.submit(search_root_move, type(board), fen, depth - 1, -alpha - 1, -alpha, deadline, generation)
+            futures[future] = move
+
+        better_moves = []
+        pending = set(futures)
+
+        try:
+            # Wait a little at a time so a stop or the deadline is noticed while the workers are busy
+            while pending:
+                if self.stopped or (self.hard_deadline and time.perf_counter() > self.hard_deadline):
+                    raise SearchTimeout
+
+                done, pending = wait(pending, STOP_POLL_INTERVAL, FIRST_COMPLETED)
+
+                for future in done:
+                    score, nodes, quiescence_nodes = future.result()
+
+                    # Count the positions the workers visit along with our own
+                    self.stats.nodes += nodes
+                    self.stats.quiescence_nodes += quiescence_nodes
+
+                    # A worker ran out of time, so this iteration can't be trusted
+                    if score is None:
+                        raise SearchTimeout
+
+                    if -score > alpha:
+                        better_moves.append(futures[future])
+        finally:
+            for future in pending:
+                future.cancel()
+
+            self.search_generation.value += 1 # Stop the workers on any moves they haven't finished
+
+        for move in better_moves:
+            board.make_move(*move)
+            score = -self.negamax(board, depth - 1, -beta, -alpha, -colour)[0]
+            board.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                self.pv_table[0] = [move]
+
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+
+        self.table.store(key, depth, best_score, flag, best_move)
+
+        return best_score, best_move
+
+    def aspiration_search(self, board, depth, colour, parallel, previous_score):
+        """Searches the root with a window around the last iteration's score, widening it until the score is inside"""
+        lower = upper = ASPIRATION_WINDOW
+
+        # Mate scores change by a move at a time, so a window around one would just fail
+        if previous_score is None or depth < ASPIRATION_MIN_DEPTH or abs(previous_score) > MATE_SCORE - 1000:
+            lower = upper = ASPIRATION_LIMIT
+
+        while True:
+            alpha = previous_score - lower if lower < ASPIRATION_LIMIT else self.ALPHA
+            beta = previous_score + upper if upper < ASPIRATION_LIMIT else self.BETA
+
+            if parallel:
+                score, move = self.parallel_root_search(board, depth, alpha, beta, colour)
+            else:
+                score, move = self.negamax(board, depth, alpha, beta, colour)
+
+            if score <= alpha:
+                lower *= 4
+            elif score >= beta:
+                upper *= 4
+            else:
+                return score, move
+
+            self.stats.aspiration_failures += 1
+
+    def generate_move(self, board, colour, time_left=None):
+        """Finds the best move for the AI using iterative deepening.
+
+        If time_left (seconds) is given, the search stops early once its share of the clock is used up
+        and returns the best move from the deepest completed iteration.
+        """
+        # The player made the expected move, so carry on with the search that's already running
+        if self.ponder_thread and board.zobrist_key == self.ponder_key:
+            return self.ponder_hit(time_left)
+
+        self.stop_pondering()
+
+        # Play straight from the opening book while the game is still in it
+        if self.book:
+            move = self.book.choose_move(board, colour)
+
+            if move:
+                self.pv = [move]
+                return move
+
+        self.begin_search(board)
+        self.set_deadlines(time_left)
+
+        with profile_search(self.profile, self.profile_path):
+            move, _ = self.search(board, colour, self.workers > 1)
+
+        return move
+
+    def set_deadlines(self, time_left):
+        if time_left is not None:
+            soft, hard = self.allocate_time(time_left)
+            now = time.perf_counter()
+
+            self.soft_deadline = now + soft
+            self.hard_deadline = now + hard
+
+    def search(self, board, colour, parallel=False):
+        """Iterative deepening from the position.
+
+        Returns (move, line): the best move of the deepest completed depth and the principal variation
+        starting with it, which is empty if not even the first iteration finished.
+        """
+        # Fall back to any legal move in case not even the first iteration finishes
+        legal_moves = board.get_legal_moves(colour)
+        best_move = legal_moves[0] if legal_moves else None
+        score = None
+
+        for depth in range(1, self.MAX_DEPTH + 1):
+            try:
+                score, move = self.aspiration_search(board, depth, colour, parallel, score)
+            except SearchTimeout:
+                # Take back the moves of the unfinished iteration
+                while len(board.history) > self.root_ply:
+                    board.unmake_move()
+                break
+
+            if move:
+                best_move = move
+
+            self.pv = self.get_pv(board, colour, depth, self.pv_table[0])
+            self.stats.complete_iteration(depth, self.table)
+
+            if self.on_iteration:
+                self.on_iteration(depth, score, self.stats)
+
+            if self.soft_deadline and time.perf_counter() > self.soft_deadline:
+                break
+
+        self.hard_deadline = None
+
+        return best_move, self.pv
+
+    def start_pondering(self, board, colour, move):
+        """Starts searching the position after the opponent's expected move in a background thread.
+
+        The search runs on its own copy of the board, with no deadline, until it reaches full depth or
+        is stopped. It always runs in this process since the workers can't be stopped part way through.
+        """
+        self.stop_pondering()
+
+        board = type(board)(board.to_fen())
+        if not board.make_move(*move):
+            return
+
+        self.ponder_key = board.zobrist_key
+        self.ponder_move = None
+
+        # Reset the search state here rather than in the thread, so a quick reply can't race it
+        self.begin_search(board)
+
+        self.ponder_thread = threading.Thread(target=self.ponder, args=(board, -colour), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder(self, board, colour):
+        self.ponder_move, _ = self.search(board, colour)
+
+    def ponder_hit(self, time_left):
+        """Gives the running ponder search a deadline as if it had just started, then waits for its move"""
+        self.set_deadlines(time_left)
+
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        self.ponder_key = None
+
+        return self.ponder_move
+
+    def stop_pondering(self):
+        """Abandons the ponder search, if one is running"""
+        if self.ponder_thread:
+            self.stopped = True
+            self.ponder_thread.join()
+            self.stopped = False
+
+        self.ponder_thread = None
+        self.ponder_key = None
+
+# Each worker process keeps its own engine, so its transposition table lasts between tasks
+worker_engine = None
+
+# Shared with the parent, which changes it when the root search the current task belongs to is over
+search_generation = None
+
+def init_worker(depth, hash_size, bitbase_directory, options, generation):
+    global worker_engine, search_generation
+    search_generation = generation
+    bitbases = Bitbases(bitbase_directory) if bitbase_directory else None
+    null_move, late_move_reductions = options
+    worker_engine = Engine(depth, hash_size, bitbases=bitbases, null_move=null_move, late_move_reductions=late_move_reductions)
+
+def search_root_move(board_class, fen, depth, alpha, beta, deadline, generation):
+    """Runs in a worker process: returns (score, nodes, quiescence nodes), with the score from the side to
+    move's point of view or None on timeout.
+
+    The deadline is a time.time() value, so time spent waiting in the queue counts against it.
+    """
+    # The root search this move was queued for has already finished or been stopped
+    if search_generation.value != generation:
+        return None, 0, 0
+
+    time_limit = None
+    if deadline is not None:
+        time_limit = deadline - time.time()
+
+        if time_limit <= 0:
+            return None, 0, 0
+
+    board = board_class(fen)
+    worker_engine.begin_search(board, time_limit)
+
+    # Watch for the parent giving up on this root search, and stop the search here when it does
+    finished = threading.Event()
+
+    def watch():
+        while not finished.wait(STOP_POLL_INTERVAL):
+            if search_generation.value != generation:
+                worker_engine.stopped = True
+                return
 
-            for end in piece.get_legal_moves(board):
-                move = (piece.coords, end)
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
 
-                if board.causes_check(move, -colour):
-                    checks.append(move)
-                elif board.get_piece_at(end[0], end[1]):
-                    captures.append(move)
-                else:
-                    moves.append(move)
+    stats = worker_engine.stats # Replaced by begin_search, so this is just this task's counts
 
-        return checks + captures + moves
+    try:
+        score, _ = worker_engine.negamax(board, depth, alpha, beta, board.turn)
+    except SearchTimeout:
+        score = None
+    finally:
+        finished.set()
+        watcher.join()
 
-    def generate_move(self, board, colour):
-        """Finds the best move for the AI"""
-        _, move = self.negamax(board, self.MAX_DEPTH, self.ALPHA, self.BETA, colour)
+        worker_engine.stopped = False
+        worker_engine.hard_deadline = None
 
-        return move
\ No newline at end of file
+    return score, stats.nodes, stats.quiescence_nodes
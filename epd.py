@@ -0,0 +1,121 @@
+import argparse
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from bitboard import BitBoard
+from engine import Engine
+from utils import parse_epd, pgn_to_move, move_to_san
+
+# Searches every position of an EPD test suite and checks the move found against its bm (best move)
+# or am (avoid move) operations. Positions are read one line at a time and only a few are queued per
+# worker, so suites of any size can be run.
+MAX_DEPTH = 64 # Depth searched to when only the time or nodes are limited
+
+def read_positions(paths):
+    """Yields (line number, EPD line) for every position in the files, skipping blank lines and comments"""
+    for path in paths:
+        with open(path) as file:
+            for number, line in enumerate(file, 1):
+                line = line.strip()
+
+                if line and not line.startswith("#"):
+                    yield f"{path}:{number}", line
+
+def solve_position(line, depth, movetime, nodes, hash_size):
+    """Runs in a worker process: returns (id, move found, solved, nodes, seconds) for one EPD line"""
+    fen, operations = parse_epd(line)
+    board = BitBoard(fen)
+    colour = board.turn
+
+    engine = Engine(depth or MAX_DEPTH, hash_size)
+    engine.begin_search(board)
+    engine.node_limit = nodes
+
+    start = time.perf_counter()
+    if movetime:
+        engine.hard_deadline = start + movetime
+
+    move, _ = engine.search(board, colour)
+    seconds = time.perf_counter() - start
+
+    if not move:
+        return operations.get("id", [""])[0], None, False, engine.stats.nodes, seconds
+
+    best_moves = [pgn_to_move(board, san, colour) for san in operations.get("bm", [])]
+    avoid_moves = [pgn_to_move(board, san, colour) for san in operations.get("am", [])]
+
+    solved = (not best_moves or move in best_moves) and move not in avoid_moves
+
+    return operations.get("id", [""])[0], move_to_san(board, move, colour), solved, engine.stats.nodes, seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an EPD test suite")
+    parser.add_argument("epd", nargs="+", help="EPD files with bm or am operations")
+    parser.add_argument("--depth", type=int, help="deepest iteration searched for each position")
+    parser.add_argument("--movetime", type=float, help="seconds to search each position for")
+    parser.add_argument("--nodes", type=int, help="positions visited per search before stopping")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the positions that weren't solved")
+    args = parser.parse_args()
+
+    if not (args.depth or args.movetime or args.nodes):
+        parser.error("give at least one of --depth, --movetime and --nodes")
+
+    positions = read_positions(args.epd)
+    running = {}
+    finished = False
+
+    total = solved = 0
+    total_nodes = 0
+    search_time = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        while True:
+            while not finished and len(running) < args.workers * 2:
+                position = next(positions, None)
+
+                if position is None:
+                    finished = True
+                    break
+
+                location, line = position
+                future = pool.submit(solve_position, line, args.depth, args.movetime, args.nodes, args.hash)
+                running[future] = location
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                location = running.pop(future)
+
+                try:
+                    name, move, correct, nodes, seconds = future.result()
+                except ValueError as error:
+                    print(f"{location}: {error}")
+                    continue
+
+                total += 1
+                solved += correct
+                total_nodes += nodes
+                search_time += seconds
+
+                if not correct or not args.quiet:
+                    print(f"{location} {name:20} {move or '-':8} {'ok' if correct else 'FAILED'}")
+
+    elapsed = time.perf_counter() - start
+
+    print(f"Solved {solved} / {total}")
+    print(f"Nodes: {total_nodes} in {elapsed:.2f}s ({int(total_nodes / elapsed) if elapsed else 0} nps overall, "
+          f"{int(total_nodes / search_time) if search_time else 0} nps per worker)")
+
+    # Fail like a test run would, so suites such as regression.epd can be used as a check
+    sys.exit(0 if solved == total else 1)
+
+if __name__ == "__main__":
+    main()
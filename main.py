@@ -1,11 +1,23 @@
 import tkinter as tk
 import threading
+import time
+import os
 
-from board import Board
+from bitbase import Bitbases
+from bitboard import BitBoard
+from book import OpeningBook
 from engine import Engine
 from utils import clamp, move_to_pgn, format_seconds
 from tkinter import messagebox
 
+BOOK_PATH = "book.bin"
+BITBASE_DIRECTORY = "bitbases"
+
+# Beginner and Intermediate always search to a fixed depth, to keep them weak. Advanced keeps deepening
+# until its share of the clock is used up, so it only needs a cap it will never reach
+FIXED_DEPTHS = {1: 1, 2: 2}
+MAX_SEARCH_DEPTH = 64
+
 class Game:
     def __init__(self, root, square_size, board_size):
         self.square_size = square_size
@@ -21,6 +33,18 @@ class Game:
         self.difficulty = 2
         self.time = 300
 
+        # Advanced difficulty searches with several processes, leaving one core for the GUI
+        self.workers = max(1, (os.cpu_count() or 1) - 1)
+        self.engine = None
+        self.ponder = True # Let the AI think about its next move during the player's turn
+
+        # Use an opening book if one has been built (see book.py)
+        self.book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
+
+        # Likewise for endgame bitbases (see bitbase.py)
+        bitbases = Bitbases(BITBASE_DIRECTORY)
+        self.bitbases = bitbases if bitbases.tables else None
+
         self.load_images()
         self.setup_ui()
         self.start_game()
@@ -31,6 +55,8 @@ class Game:
 
         self.canvas = tk.Canvas(self.root, width=self.canvas_width, height=self.canvas_height)
         self.canvas.place(x=0,y=0)
+        self.create_squares()
+        self.sprites = {} # Square each piece's image was last drawn on, or None while it's out of place
 
         # Bind events so player can move pieces
         self.canvas.bind("<Button-1>", self.on_click)
@@ -84,15 +110,26 @@ class Game:
         self.time = time
 
     def start_game(self):
-        self.images = []
         self.selected_piece = None
         self.current_turn = 1 # White starts
 
-        self.board = Board()
-        self.engine = Engine(depth=self.difficulty)
+        # The old pieces' images are no use with a new board
+        for piece in self.sprites:
+            self.canvas.delete(piece.piece_image)
+        self.sprites = {}
+
+        self.board = BitBoard()
+
+        if self.engine:
+            self.engine.close()
+
+        workers = self.workers if self.difficulty == 3 else 1
+        depth = FIXED_DEPTHS.get(self.difficulty, MAX_SEARCH_DEPTH)
+        self.engine = Engine(depth=depth, workers=workers, book=self.book, bitbases=self.bitbases)
 
         self.start_time = self.time
         self.time_left = self.start_time
+        self.ai_time_left = self.start_time # The AI's own clock, used to budget its thinking time
 
         for job in self.jobs:
             self.root.after_cancel(job)
@@ -117,23 +154,37 @@ class Game:
             self.end_game()
             messagebox.showinfo(parent=self.root, title="Game over!", message="You ran out of time")
 
+    def create_squares(self):
+        """Create the chessboard squares once, after which they're only ever recoloured"""
+        self.squares = {}
+        self.coloured_squares = set() # Squares currently showing a highlight colour
+
+        for y in range(self.board_size):
+            for x in range(self.board_size):
+                x1 = x * self.square_size
+                y1 = y * self.square_size
+                x2 = (x + 1) * self.square_size
+                y2 = (y + 1) * self.square_size
+
+                self.squares[(x, y)] = self.canvas.create_rectangle(x1, y1, x2, y2, width=0)
+                self.colour_square((x, y), "#F0D9B5", "#B58863")
+
+    def colour_square(self, coords, light, dark):
+        """Recolour a square, with the colour depending on whether it's a light or dark square"""
+        x, y = coords
+        self.canvas.itemconfigure(self.squares[coords], fill=light if (x + y) % 2 == 0 else dark)
+
+    def highlight_square(self, coords, light, dark):
+        self.colour_square(coords, light, dark)
+        self.coloured_squares.add(coords)
+
     def draw_board(self):
-        """Draw the chessboard with alternating colours"""
-        for row in range(self.board_size):
-            for column in range(self.board_size):
-                if (row + column) % 2 == 0:
-                    colour = "#F0D9B5"
-                else:
-                    colour = "#B58863"
-
-                x1 = column * self.square_size
-                y1 = row * self.square_size
-                x2 = (column + 1) * self.square_size
-                y2 = (row + 1) * self.square_size
-
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=colour, width=0)
-
-        # Show the AI's previous move move
+        """Clear any highlights and show the AI's previous move"""
+        for coords in self.coloured_squares:
+            self.colour_square(coords, "#F0D9B5", "#B58863")
+
+        self.coloured_squares = set()
+
         history = self.board.history
 
         if len(history) == 0:
@@ -145,22 +196,8 @@ class Game:
         if piece.colour == 1:
             return
 
-        coords = last_move[0], last_move[1]
-
-        for coord in coords:
-            x, y = coord
-
-            if (x + y) % 2 == 0:
-                colour = "#CDD26A"
-            else:
-                colour = "#aba23a"
-
-            x1 = x * self.square_size
-            y1 = y * self.square_size
-            x2 = (x + 1) * self.square_size
-            y2 = (y + 1) * self.square_size
-
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill=colour, width=0)
+        for coords in (last_move[0], last_move[1]):
+            self.highlight_square(coords, "#CDD26A", "#aba23a")
 
     def load_images(self):
         self.white_pieces = {
@@ -182,21 +219,28 @@ class Game:
         }
 
     def draw_pieces(self):
-        for piece in self.board.pieces:
-            if piece.colour == 1:
-                image = self.white_pieces[piece.piece_type]
-            else:
-                image = self.black_pieces[piece.piece_type]
+        """Move the images of pieces that have changed square, removing captured pieces and adding new ones"""
+        pieces = set(self.board.pieces)
+
+        for piece in [piece for piece in self.sprites if piece not in pieces]:
+            self.canvas.delete(piece.piece_image)
+            del self.sprites[piece]
 
-            piece.piece_image = self.canvas.create_image(
-                piece.coords[0] * self.square_size + self.square_size // 2,
-                piece.coords[1] * self.square_size + self.square_size // 2,
-                image=image,
-                tag="piece"
-            )
+        for piece in pieces:
+            if piece in self.sprites and self.sprites[piece] == piece.coords:
+                continue
 
-            # Keep a reference to the image to prevent garbage collection
-            self.images.append(image)
+            x = piece.coords[0] * self.square_size + self.square_size // 2
+            y = piece.coords[1] * self.square_size + self.square_size // 2
+
+            if piece in self.sprites:
+                self.canvas.coords(piece.piece_image, x, y)
+            else:
+                # New pieces are on the board, including a queen from a promotion
+                images = self.white_pieces if piece.colour == 1 else self.black_pieces
+                piece.piece_image = self.canvas.create_image(x, y, image=images[piece.piece_type], tag="piece")
+
+            self.sprites[piece] = piece.coords
 
     def on_click(self, event):
         """Handle clicking on a piece to start dragging"""
@@ -212,21 +256,10 @@ class Game:
 
         if self.selected_piece:
             # Highlight all the possible moves a player can make
-            for (x, y) in self.selected_piece.get_legal_moves(self.board):
-                x1 = x * self.square_size
-                y1 = y * self.square_size
-                x2 = (x + 1) * self.square_size
-                y2 = (y + 1) * self.square_size
+            for coords in self.selected_piece.get_legal_moves(self.board):
+                self.highlight_square(coords, "#de3d4b", "#b0272f")
 
-                if (x + y) % 2 == 0:
-                    colour = "#de3d4b"
-                else:
-                    colour = "#b0272f"
-
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=colour, width=0, tag="highlight")
-
-            self.canvas.tag_raise("piece") # So pieces are visible above the highlight
-            self.canvas.tag_raise(self.selected_piece.piece_image)
+            self.canvas.tag_raise(self.selected_piece.piece_image) # Keep the dragged piece above the others
             
     def on_drag(self, event):
         """Drag the selected piece"""
@@ -235,6 +268,7 @@ class Game:
 
         if self.selected_piece:
             self.canvas.coords(self.selected_piece.piece_image, x, y)
+            self.sprites[self.selected_piece] = None # No longer on its square, so it's put back on the next update
 
     def on_drop(self, event):
         """Drop the piece on a square"""
@@ -272,7 +306,9 @@ class Game:
         self.update_graphics()
 
     def ai_turn(self):
-        best_move = self.engine.generate_move(self.board, -1)
+        start = time.perf_counter()
+        best_move = self.engine.generate_move(self.board, -1, time_left=self.ai_time_left)
+        self.ai_time_left = max(1, self.ai_time_left - (time.perf_counter() - start))
 
         if best_move:
             start, end = best_move
@@ -284,9 +320,14 @@ class Game:
             self.move_list.insert(tk.END, f"{last_move} {move_to_pgn(move)}")
             self.move_list.yview(tk.END)
 
+            # Start thinking about the reply the AI expects, while the player's clock runs
+            if self.ponder and len(self.engine.pv) > 1 and self.engine.pv[0] == best_move:
+                self.engine.start_pondering(self.board, 1, self.engine.pv[1])
+
             self.root.after(0, self.ai_done)
 
     def end_game(self):
+        self.engine.stop_pondering()
         self.update_graphics()
 
         # Rebind canvas events so player can't interact with board anymore
@@ -309,10 +350,7 @@ class Game:
             messagebox.showinfo(parent=self.root, title="Stalemate!", message="It's a draw")
 
     def update_graphics(self):
-        """Updates the graphics based on the board state"""
-        self.canvas.delete("piece") # Remove all the old piece images
-        self.canvas.delete("highlight")
-
+        """Updates the graphics based on the board state, changing only the canvas items that need it"""
         self.draw_board()
         self.draw_pieces()
 
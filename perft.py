@@ -0,0 +1,132 @@
+import argparse
+import sys
+import time
+
+from board import Board, STARTING_FEN
+from bitboard import BitBoard
+from utils import coords_to_notation
+
+# Standard test positions with their known leaf counts at each depth.
+# Pawns always promote to a Queen here, so only depths where no promotion is possible are listed.
+PERFT_SUITE = [
+    ("Start position", STARTING_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", {1: 48, 2: 2039, 3: 97862}),
+    ("Rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("Middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", {1: 46, 2: 2079, 3: 89890}),
+    ("Illegal en passant (pin)", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {1: 18, 2: 92, 3: 1670, 4: 10138}),
+    ("Illegal en passant (bishop)", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {1: 13, 2: 102, 3: 1266, 4: 10276}),
+    ("En passant out of check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {1: 15, 2: 126, 3: 1928, 4: 13931}),
+    ("Short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {1: 15, 2: 66, 3: 1198, 4: 6399}),
+    ("Long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {1: 16, 2: 71, 3: 1286, 4: 7418}),
+    ("Castling rights lost to capture", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {1: 26, 2: 1141, 3: 27826}),
+    ("Castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {1: 44, 2: 1494, 3: 50509}),
+    ("Discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {1: 29, 2: 165, 3: 5160}),
+    ("Self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {1: 2, 2: 6, 3: 13, 4: 63}),
+    ("Stalemate and checkmate", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {1: 37, 2: 183, 3: 6559})
+]
+
+BACKENDS = {
+    "board": Board,
+    "bitboard": BitBoard
+}
+
+def perft(board, depth, colour):
+    """Counts the positions reached after playing every sequence of legal moves to the given depth"""
+    if depth == 0:
+        return 1
+
+    moves = board.get_legal_moves(colour)
+
+    # No need to play the last move of each sequence, just count them
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+
+    for start, end in moves:
+        board.make_move(start, end)
+        nodes += perft(board, depth - 1, -colour)
+        board.unmake_move()
+
+    return nodes
+
+def divide(board, depth, colour):
+    """Breaks the perft count down by the first move played"""
+    counts = {}
+
+    for start, end in board.get_legal_moves(colour):
+        board.make_move(start, end)
+        counts[(start, end)] = perft(board, depth - 1, -colour)
+        board.unmake_move()
+
+    return counts
+
+def timed_perft(board, depth):
+    """Returns (nodes, seconds taken) for a perft from the side to move"""
+    start = time.perf_counter()
+    nodes = perft(board, depth, board.turn)
+
+    return nodes, time.perf_counter() - start
+
+def nodes_per_second(nodes, seconds):
+    return int(nodes / seconds) if seconds > 0 else 0
+
+def run_suite(backend, max_nodes):
+    """Checks every position in the suite, skipping counts above max_nodes. Returns True if all match"""
+    passed = True
+    total_nodes = 0
+    total_time = 0
+
+    for name, fen, counts in PERFT_SUITE:
+        for depth, expected in counts.items():
+            if expected > max_nodes:
+                continue
+
+            nodes, seconds = timed_perft(backend(fen), depth)
+            total_nodes += nodes
+            total_time += seconds
+
+            result = "ok" if nodes == expected else "FAILED"
+            passed = passed and nodes == expected
+
+            print(f"{name:32} depth {depth}  {nodes:>9} / {expected:<9} {result:6}  {nodes_per_second(nodes, seconds):>8} nps")
+
+    print(f"Total: {total_nodes} nodes in {total_time:.2f}s ({nodes_per_second(total_nodes, total_time)} nps)")
+
+    return passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move generation leaf nodes (perft) to check correctness and speed")
+    parser.add_argument("--fen", default=STARTING_FEN, help="position to search from")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="show the count for each first move")
+    parser.add_argument("--suite", action="store_true", help="run the standard test positions")
+    parser.add_argument("--max-nodes", type=int, default=100000, help="skip suite entries larger than this")
+    parser.add_argument("--backend", choices=BACKENDS, default="bitboard")
+    args = parser.parse_args()
+
+    backend = BACKENDS[args.backend]
+
+    if args.suite:
+        passed = run_suite(backend, args.max_nodes)
+        sys.exit(0 if passed else 1)
+
+    board = backend(args.fen)
+
+    if args.divide:
+        start = time.perf_counter()
+        counts = divide(board, args.depth, board.turn)
+        seconds = time.perf_counter() - start
+
+        lines = [f"{coords_to_notation(move_start)}{coords_to_notation(move_end)}: {nodes}" for (move_start, move_end), nodes in counts.items()]
+        print("\n".join(sorted(lines)))
+
+        nodes = sum(counts.values())
+    else:
+        nodes, seconds = timed_perft(board, args.depth)
+
+    print(f"Nodes: {nodes}")
+    print(f"Time: {seconds:.2f}s ({nodes_per_second(nodes, seconds)} nps)")
+
+if __name__ == "__main__":
+    main()
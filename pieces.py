@@ -1,6 +1,16 @@
+from tables import square_coords, knight_targets, king_targets, pawn_attacks, rays, between, rook_directions, bishop_directions
+
+# One shared (x, y) tuple per square, so generating moves doesn't create new ones. Index = y * 8 + x
+COORDS = square_coords
+
 class Piece:
+    # Pieces are created and moved constantly during a search, so they don't carry a __dict__
+    __slots__ = ("coords", "colour", "piece_type", "piece_image")
+
+    value = 0
+
     def __init__(self, x, y, colour, piece_type):
-        self.coords = (x, y)
+        self.coords = COORDS[y * 8 + x]
         self.colour = colour # 1 for white, -1 for black
 
         self.piece_type = piece_type # Single character e.g. "p" for Pawn
@@ -8,191 +18,136 @@ class Piece:
 
     def move(self, new_x, new_y):
         """Move the piece to a new location"""
-        self.coords = (new_x, new_y)
-            
-    def has_moved(self, board):
-        """Returns True if the piece has moved at least once"""
-        history = board.history
+        self.coords = COORDS[new_y * 8 + new_x]
+
+    def get_value(self):
+        return self.value
 
-        for move in history:
-            if self == move[2]:
-                return True
+    def slide(self, board, directions):
+        """Moves along each direction until the edge of the board or a piece, including a capture of that piece.
 
-        return False
-    
-    def get_legal_moves(self, board):
-        """Returns only moves that do not leave the king in check"""
-        legal_moves = []
+        Shared by all the sliding pieces.
+        """
+        x, y = self.coords
+        index = y * 8 + x
+        colour = self.colour
+        squares = board.squares
+        moves = []
+
+        for direction in directions:
+            for target in rays[direction][index]:
+                blocking_piece = squares[target]
+
+                if blocking_piece:
+                    if blocking_piece.colour != colour:
+                        moves.append(COORDS[target])
+                    break
+
+                moves.append(COORDS[target])
+
+        return moves
+
+    def step(self, board, targets):
+        """Moves to each of a list of target squares that isn't blocked by our own piece, for knights and kings"""
+        x, y = self.coords
+        colour = self.colour
+        squares = board.squares
+        moves = []
 
-        for end in self.get_moves(board):
-            if not board.causes_check((self.coords, end), self.colour):
-                legal_moves.append(end)
+        for target in targets[y * 8 + x]:
+            blocking_piece = squares[target]
 
-        return legal_moves
+            if not blocking_piece or blocking_piece.colour != colour:
+                moves.append(COORDS[target])
+
+        return moves
+    
+    def get_legal_moves(self, board):
+        """Returns only moves that do not leave the king in check, taken from the board's cached legal moves"""
+        return [end for start, end in board.get_legal_moves(self.colour) if start == self.coords]
 
 class Pawn(Piece):
+    __slots__ = ()
+    value = 100
+
     def get_moves(self, board):
         """Generate legal moves for a pawn"""
         x, y = self.coords
         direction = -self.colour # White moves up, black moves down
+        squares = board.squares
 
         moves = []
         
-        # Single step forward
-        if 0 <= y + direction < 8:
-            if not board.get_piece_at(x, y + direction):
-                moves.append((x, y + direction))
+        # Single step forward, then a double step from the pawn's starting rank
+        forward = (y + direction) * 8 + x
+        if 0 <= forward < 64 and not squares[forward]:
+            moves.append(COORDS[forward])
 
-        # Double step forward
-        if not self.has_moved(board) and 0 <= y + 2 * direction < 8:
-            if not board.get_piece_at(x, y + direction) and not board.get_piece_at(x, y + 2 * direction):
-                moves.append((x, y + 2 * direction))
+            start_rank = 6 if self.colour == 1 else 1
+            if y == start_rank and not squares[forward + direction * 8]:
+                moves.append(COORDS[forward + direction * 8])
 
-        # Capture diagonally left
-        if 0 <= x - 1 < 8 and 0 <= y + direction < 8:
-            target_pos = (x - 1, y + direction)
-            blocking_piece = board.get_piece_at(x-1, y+direction)
+        # Captures diagonally forwards
+        for target in pawn_attacks[self.colour][y * 8 + x]:
+            blocking_piece = squares[target]
 
             if blocking_piece and blocking_piece.colour != self.colour:
-                moves.append(target_pos)
-
-        # Capture diagonally right
-        if 0 <= x + 1 < 8 and 0 <= y + direction < 8:
-            target_pos = (x + 1, y + direction)
-            blocking_piece = board.get_piece_at(x+1, y+direction)
-            
-            if blocking_piece and blocking_piece.colour != self.colour:
-                moves.append(target_pos)
+                moves.append(COORDS[target])
 
         # En Passant
-        if board.history:
-            for piece in board.pieces:
-                if piece.colour == self.colour:
-                    continue
-
-                last_move = board.history[-1]
-                start, end, other_piece, _, _ = last_move
+        if board.en_passant:
+            target_x, target_y = board.en_passant
 
-                y_distance = abs(start[1] - end[1])
-                x_distance = abs(self.coords[0] - other_piece.coords[0])
-
-                if y_distance == 2 and x_distance == 1 and other_piece.piece_type == "p":
-                    if self.coords[1] == other_piece.coords[1]:
-                        moves.append((other_piece.coords[0], other_piece.coords[1] + direction))
+            if abs(target_x - x) == 1 and target_y == y + direction:
+                moves.append(board.en_passant)
 
         return moves
-    
-    def get_value(self):
-        return 100
 
 class Knight(Piece):
+    __slots__ = ()
+    value = 300
+
     def get_moves(self, board):
         """Generate legal moves for a knight given"""
-        x, y = self.coords
-        moves = []
-        
-        directions = [(-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1)]
-        
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < 8 and 0 <= ny < 8:
-                blocking_piece = board.get_piece_at(nx, ny)
-                if blocking_piece:
-                    if blocking_piece.colour != self.colour:
-                        moves.append((nx, ny))
-                    continue
-                moves.append((nx, ny))
-        
-        return moves
-    
-    def get_value(self):
-        return 300
+        return self.step(board, knight_targets)
 
 class Bishop(Piece):
+    __slots__ = ()
+    value = 300
+    directions = bishop_directions
+
     def get_moves(self, board):
         """Generate legal moves for a bishop"""
-        x, y = self.coords
-        moves = []
-        directions = [(-1, -1), (1, -1), (-1, 1), (1, 1)]
-    
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            while 0 <= nx < 8 and 0 <= ny < 8:
-                blocking_piece = board.get_piece_at(nx, ny)
-                if blocking_piece:
-                    if blocking_piece.colour != self.colour:
-                        moves.append((nx, ny))
-                    break
-                moves.append((nx, ny))
-
-                nx += dx
-                ny += dy
-    
-        return moves
-    
-    def get_value(self):
-        return 300
+        return self.slide(board, self.directions)
 
 class Rook(Piece):
+    __slots__ = ()
+    value = 500
+    directions = rook_directions
+
     def get_moves(self, board):
         """Generate legal moves for a rook"""
-        x, y = self.coords
-        moves = []
-    
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-    
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            while 0 <= nx < 8 and 0 <= ny < 8:
-                blocking_piece = board.get_piece_at(nx, ny)
-                if blocking_piece:
-                    if blocking_piece.colour != self.colour:
-                        moves.append((nx, ny))
-                    break
-                moves.append((nx, ny))
-
-                nx += dx
-                ny += dy
-    
-        return moves
-    
-    def get_value(self):
-        return 500
+        return self.slide(board, self.directions)
 
 class Queen(Piece):
+    __slots__ = ()
+    value = 900
+    directions = Rook.directions + Bishop.directions # The Queen moves like a Bishop and Rook combined
+
     def get_moves(self, board):
         """Generate legal moves for the queen"""
-
-        # The Queen's moves are just a combination of the Bishop and Rook
-        rook = Rook(self.coords[0], self.coords[1], self.colour, self.piece_type)
-        bishop = Bishop(self.coords[0], self.coords[1], self.colour, self.piece_type)
-        
-        # To reuse code we can get the moves of both pieces and combine them
-        return rook.get_moves(board) + bishop.get_moves(board)
-    
-    def get_value(self):
-        return 900
+        return self.slide(board, self.directions)
 
 class King(Piece):
+    __slots__ = ()
+    value = 10000000 # The king is invaluable
+
     def get_moves(self, board):
         """Generate legal moves for the king"""
-        x, y = self.coords
-        moves = []
-        
-        directions = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
-        
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < 8 and 0 <= ny < 8:
-                blocking_piece = board.get_piece_at(nx, ny)
-                if blocking_piece:
-                    if blocking_piece.colour != self.colour :
-                        moves.append((nx, ny))
-                    continue
-                moves.append((nx, ny))
+        moves = self.step(board, king_targets)
         
         # Castling
-        if not self.has_moved(board) and not board.in_check(self.colour):
+        if not board.in_check(self.colour):
             moves += self.get_castling_moves(board)
         
         return moves
@@ -206,28 +161,25 @@ class King(Piece):
         rooks = [(7, y), (0, y)]
 
         for rook_x, rook_y in rooks:
+            if not board.can_castle(self.colour, rook_x == 7):
+                continue
+
             rook = board.get_piece_at(rook_x, rook_y)
-            if rook and rook.piece_type == "r" and not rook.has_moved(board):
+            if rook and rook.piece_type == "r":
                 if self.clear_path((x, y), (rook_x, rook_y), board):
                     if rook_x == 7: # Kingside
-                        castling_moves.append((x + 2, y))
+                        castling_moves.append(COORDS[y * 8 + x + 2])
                     else: # Queenside
-                        castling_moves.append((x - 2, y))
+                        castling_moves.append(COORDS[y * 8 + x - 2])
 
         return castling_moves
     
     def clear_path(self, start, end, board):
         """Returns True if there are no pieces between start and end"""
-        x1, y1 = start
-        x2, y2 = end
-        
-        step = 1 if x1 < x2 else -1
+        squares = board.squares
 
-        for x in range(x1 + step, x2, step):
-            if board.get_piece_at(x, y1):
+        for index in between[start[1] * 8 + start[0]][end[1] * 8 + end[0]]:
+            if squares[index]:
                 return False
 
         return True
-    
-    def get_value(self):
-        return 10000000 # The king is invaluable
\ No newline at end of file
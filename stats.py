@@ -0,0 +1,122 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+PROFILE_MODES = ("cpu", "memory")
+PROFILE_LINES = 25 # Functions or allocation sites listed in each report
+
+class SearchStats:
+    """Counters for one search, reset by Engine.begin_search and filled in as the search runs"""
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.seconds = 0 # Time taken up to the end of the last completed iteration
+        self.depth = 0 # Deepest completed iteration
+
+        self.nodes = 0 # Every position visited, including quiescence
+        self.quiescence_nodes = 0
+        self.iteration_nodes = [] # Total nodes at the end of each completed iteration
+
+        self.cutoffs = 0 # Beta cutoffs in the main search
+        self.first_move_cutoffs = 0 # Cutoffs caused by the first move searched, a measure of move ordering
+        self.aspiration_failures = 0 # Root searches repeated because the score fell outside the aspiration window
+
+        self.table_probes = 0
+        self.table_hits = 0
+        self.table_fill = 0 # Share of the transposition table in use, sampled after each iteration
+
+        self.bitbase_probes = 0
+        self.bitbase_hits = 0
+
+    def complete_iteration(self, depth, table):
+        self.depth = depth
+        self.seconds = time.perf_counter() - self.start_time
+        self.iteration_nodes.append(self.nodes)
+        self.table_fill = table.fill_rate()
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0
+
+    @property
+    def table_hit_rate(self):
+        return self.table_hits / self.table_probes if self.table_probes else 0
+
+    @property
+    def bitbase_hit_rate(self):
+        return self.bitbase_hits / self.bitbase_probes if self.bitbase_probes else 0
+
+    @property
+    def branching_factor(self):
+        """Effective branching factor: how many times more nodes the last iteration took than the one before"""
+        if len(self.iteration_nodes) < 2:
+            return 0
+
+        previous = self.iteration_nodes[-2]
+        last = self.iteration_nodes[-1] - previous
+
+        # The first iteration's count is its own, later ones are the difference between running totals
+        if len(self.iteration_nodes) > 2:
+            previous -= self.iteration_nodes[-3]
+
+        return last / previous if previous else 0
+
+    def __str__(self):
+        return (
+            f"depth {self.depth}  nodes {self.nodes} ({self.quiescence_nodes} quiescence)  {self.nps} nps  "
+            f"ebf {self.branching_factor:.2f}  cutoffs {self.cutoffs} ({self.first_move_cutoff_rate:.0%} first move)  "
+            f"aspiration fails {self.aspiration_failures}  "
+            f"tt hits {self.table_hit_rate:.0%} fill {self.table_fill:.0%}  bitbase hits {self.bitbase_hit_rate:.0%}"
+        )
+
+@contextmanager
+def profile_search(mode, path):
+    """Runs the body under cProfile ("cpu") or tracemalloc ("memory") and appends the report to a file.
+
+    With no mode this does nothing, so a search can always be wrapped in it.
+    """
+    if mode is None:
+        yield
+        return
+
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+
+    report = io.StringIO()
+    start = time.perf_counter()
+
+    if mode == "cpu":
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        try:
+            yield
+        finally:
+            profiler.disable()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    else:
+        tracemalloc.start()
+
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            report.write(f"Current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n")
+
+            for statistic in snapshot.statistics("lineno")[:PROFILE_LINES]:
+                report.write(f"{statistic}\n")
+
+    with open(path, "a") as file:
+        file.write(f"=== {mode} profile of a search taking {time.perf_counter() - start:.2f}s ===\n")
+        file.write(report.getvalue())
+        file.write("\n")
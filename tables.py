@@ -1,3 +1,5 @@
+import random
+
 piece_square_tables = {
     "p": [
         [ 0,   0,   0,   0,   0,   0,   0,   0 ],
@@ -59,4 +61,103 @@ piece_square_tables = {
         [ 20,  20,   0,   0,   0,   0,  20,  20], 
         [ 20,  30,  10,   0,   0,  10,  30,  20]
     ]
-}
\ No newline at end of file
+}
+
+# Random numbers for Zobrist hashing. A fixed seed keeps hashes the same between runs,
+# which lets hashes be saved to files (e.g. opening books)
+zobrist_random = random.Random(20240229)
+
+zobrist_pieces = {
+    colour: {
+        piece_type: [zobrist_random.getrandbits(64) for _ in range(64)]
+        for piece_type in ("p", "n", "b", "r", "q", "k")
+    }
+    for colour in (1, -1)
+}
+
+zobrist_side = zobrist_random.getrandbits(64) # XORed in and out every move, so the side to move is part of the hash
+
+# One number per castling right, combined for every set of rights so that having no rights hashes to 0
+zobrist_castling_flags = [zobrist_random.getrandbits(64) for _ in range(4)]
+zobrist_castling = [0] * 16
+
+for rights in range(16):
+    for flag in range(4):
+        if rights & (1 << flag):
+            zobrist_castling[rights] ^= zobrist_castling_flags[flag]
+
+zobrist_en_passant = [zobrist_random.getrandbits(64) for _ in range(8)] # One for each file of the en passant square
+
+# Move generation tables, worked out once when the module loads. Squares are numbered the same way
+# as Board.squares (index = y * 8 + x) and each entry is a tuple of square indices.
+square_coords = tuple((index % 8, index // 8) for index in range(64)) # One shared (x, y) tuple per square
+
+knight_offsets = ((-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1))
+king_offsets = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+rook_directions = ((-1, 0), (1, 0), (0, -1), (0, 1))
+bishop_directions = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+
+def on_board(x, y):
+    return 0 <= x < 8 and 0 <= y < 8
+
+def step_targets(offsets):
+    """Squares reached from each square by a single step along each offset"""
+    return tuple(
+        tuple((y + dy) * 8 + x + dx for dx, dy in offsets if on_board(x + dx, y + dy))
+        for x, y in square_coords
+    )
+
+def ray(index, dx, dy):
+    """Squares from a square to the edge of the board in one direction, nearest first"""
+    x, y = square_coords[index]
+    squares = []
+
+    x, y = x + dx, y + dy
+    while on_board(x, y):
+        squares.append(y * 8 + x)
+        x, y = x + dx, y + dy
+
+    return tuple(squares)
+
+knight_targets = step_targets(knight_offsets)
+king_targets = step_targets(king_offsets)
+
+# Squares attacked by a pawn of each colour, white pawns attack towards y = 0
+pawn_attacks = {
+    1: step_targets(((-1, -1), (1, -1))),
+    -1: step_targets(((-1, 1), (1, 1)))
+}
+
+rays = {direction: tuple(ray(index, *direction) for index in range(64)) for direction in rook_directions + bishop_directions}
+
+def direction_between(start, end):
+    """The (dx, dy) step from one square towards another, or None if they aren't on a shared line"""
+    x1, y1 = square_coords[start]
+    x2, y2 = square_coords[end]
+    dx, dy = x2 - x1, y2 - y1
+
+    if start == end or (dx and dy and abs(dx) != abs(dy)):
+        return None
+
+    return (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+
+def squares_between(start, end):
+    direction = direction_between(start, end)
+    if not direction:
+        return ()
+
+    squares = rays[direction][start]
+    return squares[:squares.index(end)]
+
+def line_through(start, end):
+    """Every square on the rank, file or diagonal through both squares, in order"""
+    direction = direction_between(start, end)
+    if not direction:
+        return ()
+
+    backwards = rays[(-direction[0], -direction[1])][start]
+    return backwards[::-1] + (start,) + rays[direction][start]
+
+between = tuple(tuple(squares_between(start, end) for end in range(64)) for start in range(64)) # Squares strictly between two squares
+lines = tuple(tuple(line_through(start, end) for end in range(64)) for start in range(64))
@@ -0,0 +1,285 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from bitboard import BitBoard
+from board import STARTING_FEN
+from engine import Engine
+from utils import move_to_san, parse_epd
+
+# Plays engine configurations against each other and reports the result from the first one's point of view.
+#
+# A configuration is a comma separated list of settings, for example "depth=3" or "depth=4,time=60,pst=tables.json":
+#   name   shown in the PGN and the summary (defaults to the settings themselves)
+#   depth  deepest iteration searched for each move (default 3)
+#   time   seconds on each side's clock for the whole game, spent the same way as in the GUI
+#   hash   transposition table size in MB
+#   pst    JSON file with piece-square tables to use instead of the ones in tables.py
+#   null   1 to use null-move pruning, 0 to turn it off (default 1)
+#   lmr    1 to use late move reductions, 0 to turn them off (default 1)
+DEFAULT_DEPTH = 3
+MAX_PLIES = 400 # Games still going after this many moves are scored as draws
+
+def parse_config(text):
+    config = {"name": text, "depth": DEFAULT_DEPTH, "time": None, "hash": 16, "pst": None, "null": 1, "lmr": 1}
+
+    for setting in text.split(","):
+        key, _, value = setting.partition("=")
+
+        if key not in config:
+            raise argparse.ArgumentTypeError(f"unknown setting {key!r}")
+
+        config[key] = value if key in ("name", "pst") else float(value) if key == "time" else int(value)
+
+    return config
+
+def make_board_class(config):
+    """The board to search on for a configuration, with its own piece-square tables if it has any"""
+    if not config["pst"]:
+        return BitBoard
+
+    with open(config["pst"]) as file:
+        tables = json.load(file)
+
+    return type("TunedBoard", (BitBoard,), {"square_tables": tables})
+
+def read_openings(path):
+    """Reads one position per line from an EPD file (or a FEN file, since the move clocks are read the same way)"""
+    openings = []
+
+    with open(path) as file:
+        for line in file:
+            fields = line.split()
+
+            if len(fields) == 6 and fields[4].isdigit():
+                openings.append(line.strip())
+            elif len(fields) >= 4:
+                openings.append(parse_epd(line)[0])
+
+    return openings
+
+def insufficient_material(board):
+    """Neither side can checkmate with only kings and at most one knight or bishop left"""
+    others = [piece for piece in board.pieces if piece.piece_type != "k"]
+
+    return not others or (len(others) == 1 and others[0].piece_type in ("n", "b"))
+
+def play_game(white, black, fen, max_plies):
+    """Plays one game between two configurations. Returns (result, termination, moves in algebraic notation)"""
+    configs = (white, black)
+    boards = [make_board_class(config)(fen) for config in configs]
+    engines = [
+        Engine(config["depth"], config["hash"], null_move=bool(config["null"]), late_move_reductions=bool(config["lmr"]))
+        for config in configs
+    ]
+    clocks = [config["time"] for config in configs]
+
+    board = boards[0] # Used for the rules, both boards always hold the same position
+    colour = board.turn
+    moves = []
+
+    repetitions = {board.zobrist_key: 1}
+
+    while True:
+        if not board.get_legal_moves(colour):
+            if board.in_check(colour):
+                return ("0-1" if colour == 1 else "1-0"), "checkmate", moves
+
+            return "1/2-1/2", "stalemate", moves
+
+        if repetitions[board.zobrist_key] >= 3:
+            return "1/2-1/2", "threefold repetition", moves
+
+        if board.halfmove_clock >= 100:
+            return "1/2-1/2", "fifty-move rule", moves
+
+        if insufficient_material(board):
+            return "1/2-1/2", "insufficient material", moves
+
+        if len(moves) >= max_plies:
+            return "1/2-1/2", "move limit", moves
+
+        side = 0 if colour == 1 else 1
+        start = time.perf_counter()
+        move = engines[side].generate_move(boards[side], colour, time_left=clocks[side])
+
+        if clocks[side] is not None:
+            clocks[side] = max(0.1, clocks[side] - (time.perf_counter() - start))
+
+        moves.append(move_to_san(board, move, colour))
+
+        for each_board in boards:
+            each_board.make_move(*move)
+
+        repetitions[board.zobrist_key] = repetitions.get(board.zobrist_key, 0) + 1
+        colour = -colour
+
+def format_pgn(headers, moves, fen):
+    lines = [f'[{key} "{value}"]' for key, value in headers.items()]
+
+    fields = fen.split()
+    black_to_move = fields[1] == "b"
+    words = []
+
+    for ply, move in enumerate(moves):
+        number = (ply + black_to_move) // 2 + int(fields[5])
+
+        if ply == 0 and black_to_move:
+            words.append(f"{number}...")
+        elif (ply + black_to_move) % 2 == 0:
+            words.append(f"{number}.")
+
+        words.append(move)
+
+    words.append(headers["Result"])
+
+    # Keep movetext lines under 80 characters
+    movetext = []
+    line = ""
+    for word in words:
+        if line and len(line) + len(word) >= 80:
+            movetext.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+
+    movetext.append(line)
+
+    return "\n".join(lines) + "\n\n" + "\n".join(movetext) + "\n\n"
+
+def elo_estimate(wins, draws, losses):
+    """Returns (Elo difference, 95% error margin) for the score so far"""
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+
+    # Keep away from 0% and 100%, where the difference would be infinite
+    score = min(max(score, 0.5 / games), 1 - 0.5 / games)
+    elo = -400 * math.log10(1 / score - 1)
+
+    deviation = math.sqrt((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games)
+    margin = 1.96 * deviation / math.sqrt(games) * 400 / math.log(10) / (score * (1 - score))
+
+    return elo, margin
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of elo1 against elo0, using the normal approximation to the score"""
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+
+    if variance == 0:
+        return 0
+
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other")
+    parser.add_argument("first", type=parse_config, help="configuration being tested, e.g. depth=3")
+    parser.add_argument("second", type=parse_config, help="configuration to compare against")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="games played at once")
+    parser.add_argument("--openings", help="FEN or EPD file of starting positions, each played with both colours")
+    parser.add_argument("--pgn", default="tournament.pgn", help="file the games are added to as they finish")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"), help="stop once either Elo bound is accepted")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT false negative rate")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    openings = read_openings(args.openings) if args.openings else [STARTING_FEN]
+    random.Random(args.seed).shuffle(openings)
+
+    lower = math.log(args.beta / (1 - args.alpha))
+    upper = math.log((1 - args.beta) / args.alpha)
+
+    def games():
+        # Each opening is played twice, once with each configuration as White
+        for number in range(args.games):
+            fen = openings[number // 2 % len(openings)]
+            yield number, fen, number % 2 == 0
+
+    wins = draws = losses = 0
+    scheduled = games()
+    running = {}
+    finished = False
+    date = time.strftime("%Y.%m.%d")
+
+    with ProcessPoolExecutor(args.workers) as pool, open(args.pgn, "a") as pgn:
+        while True:
+            # Only keep a couple of games queued per worker, so memory doesn't grow with the number of games
+            while not finished and len(running) < args.workers * 2:
+                game = next(scheduled, None)
+
+                if game is None:
+                    finished = True
+                    break
+
+                number, fen, first_is_white = game
+                white, black = (args.first, args.second) if first_is_white else (args.second, args.first)
+
+                future = pool.submit(play_game, white, black, fen, args.max_plies)
+                running[future] = (number, fen, white, black, first_is_white)
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                number, fen, white, black, first_is_white = running.pop(future)
+                result, termination, moves = future.result()
+
+                headers = {
+                    "Event": "Engine tournament",
+                    "Site": "?",
+                    "Date": date,
+                    "Round": number + 1,
+                    "White": white["name"],
+                    "Black": black["name"],
+                    "Result": result,
+                    "Termination": termination,
+                    "PlyCount": len(moves)
+                }
+
+                if fen != STARTING_FEN:
+                    headers["SetUp"] = "1"
+                    headers["FEN"] = fen
+
+                pgn.write(format_pgn(headers, moves, fen))
+                pgn.flush()
+
+                if result == "1/2-1/2":
+                    draws += 1
+                elif (result == "1-0") == first_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+
+            played = wins + draws + losses
+            elo, margin = elo_estimate(wins, draws, losses)
+            status = f"Games {played}: +{wins} ={draws} -{losses}  Elo {elo:+.1f} +/- {margin:.1f}"
+
+            if args.sprt:
+                llr = sprt_llr(wins, draws, losses, *args.sprt)
+                status += f"  LLR {llr:.2f} ({lower:.2f}, {upper:.2f})"
+
+                if llr <= lower or llr >= upper:
+                    print(status)
+                    print(f"SPRT: H{0 if llr <= lower else 1} accepted")
+
+                    for future in running:
+                        future.cancel()
+                    break
+
+            print(status)
+
+if __name__ == "__main__":
+    main()
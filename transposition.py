@@ -0,0 +1,52 @@
+# Bound types for stored scores
+EXACT = 0
+LOWER_BOUND = 1 # The search failed high, the real score is at least this
+UPPER_BOUND = 2 # The search failed low, the real score is at most this
+
+# Rough memory used by one stored entry: the tuple itself, the key, the score and the move
+ENTRY_SIZE = 200
+
+class TranspositionTable:
+    """Fixed-size hash table of search results, indexed by Zobrist key"""
+    def __init__(self, size_mb=16):
+        self.size = max(1, size_mb * 1024 * 1024 // ENTRY_SIZE)
+        self.entries = [None] * self.size
+        self.generation = 0 # Increased every search so old entries can be replaced first
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def fill_rate(self, sample=1000):
+        """Share of entries written during this search, estimated from the first few slots"""
+        entries = self.entries[:sample]
+        used = sum(1 for entry in entries if entry and entry[5] == self.generation)
+
+        return used / len(entries)
+
+    def probe(self, key):
+        """Returns (depth, score, flag, move) for a position, or None if it isn't stored"""
+        entry = self.entries[key % self.size]
+
+        if entry and entry[0] == key:
+            return entry[1:5]
+
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key % self.size
+        entry = self.entries[index]
+
+        # Depth-preferred replacement: keep a deeper result for a different position from this search,
+        # but always overwrite results from earlier searches and older results for the same position
+        if entry and entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return
+
+        # Don't lose the best move we already know when storing a result without one
+        if move is None and entry and entry[0] == key:
+            move = entry[4]
+
+        self.entries[index] = (key, depth, score, flag, move, self.generation)
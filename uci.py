@@ -0,0 +1,253 @@
+import sys
+import threading
+import time
+
+from bitbase import Bitbases
+from bitboard import BitBoard
+from engine import Engine, MATE_SCORE
+from utils import coords_to_notation, notation_to_coords
+
+# Headless engine speaking the Universal Chess Interface over stdin and stdout.
+# Nothing here (or in the modules it imports) touches tkinter, so it runs without a display.
+NAME = "Chess-NEA"
+AUTHOR = "TabaxiHunter"
+
+MAX_DEPTH = 64 # Depth searched to when a go command only limits the time or nodes
+DEFAULT_HASH = 16
+BITBASE_DIRECTORY = "bitbases"
+
+def move_to_uci(board, move):
+    """Converts a (start, end) move to long algebraic notation such as e2e4 or e7e8q"""
+    start, end = move
+    piece = board.get_piece_at(start[0], start[1])
+    promotion = "q" if piece and piece.piece_type == "p" and end[1] in (0, 7) else ""
+
+    return coords_to_notation(start) + coords_to_notation(end) + promotion
+
+def uci_to_move(text):
+    """Converts long algebraic notation to a (start, end) move. Pawns always promote to a queen"""
+    squares = (text[0:2], text[2:4])
+
+    if len(text) not in (4, 5) or (len(text) == 5 and text[4] not in "qrbn"):
+        raise ValueError(f"invalid move {text!r}")
+
+    if not all(len(square) == 2 and square[0] in "abcdefgh" and square[1] in "12345678" for square in squares):
+        raise ValueError(f"invalid move {text!r}")
+
+    return notation_to_coords(squares[0]), notation_to_coords(squares[1])
+
+def format_score(score):
+    """Formats a search score for an info line, in centipawns or moves to mate"""
+    if abs(score) > MATE_SCORE - 1000:
+        plies = MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+
+        return f"mate {moves if score > 0 else -moves}"
+
+    return f"cp {int(score)}"
+
+class UCI:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.lock = threading.Lock() # The search thread writes info lines while commands are read
+
+        self.hash_size = DEFAULT_HASH
+        self.workers = 1
+        self.bitbases = Bitbases(BITBASE_DIRECTORY)
+
+        self.engine = None
+        self.new_game()
+
+        self.board = BitBoard()
+        self.thread = None
+
+        # After go infinite the best move is held back until stop, even if the search ends first
+        self.infinite = False
+        self.stop_requested = threading.Event()
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def new_game(self):
+        if self.engine:
+            self.engine.close()
+
+        bitbases = self.bitbases if self.bitbases.tables else None
+        self.engine = Engine(MAX_DEPTH, self.hash_size, self.workers, bitbases=bitbases)
+        self.engine.on_iteration = self.send_info
+
+    def run(self, input=sys.stdin):
+        for line in input:
+            if not self.handle(line.split()):
+                break
+
+        self.stop()
+        self.engine.close()
+
+    def handle(self, tokens):
+        """Runs one command, returning False once it's time to quit"""
+        if not tokens:
+            return True
+
+        command, arguments = tokens[0], tokens[1:]
+
+        # A bad command from the GUI is reported and ignored rather than ending the engine
+        try:
+            return self.run_command(command, arguments)
+        except (ValueError, IndexError) as error:
+            self.send(f"info string {error}")
+            return True
+
+    def run_command(self, command, arguments):
+        if command == "uci":
+            self.send(f"id name {NAME}")
+            self.send(f"id author {AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH} min 1 max 1024")
+            self.send("option name Threads type spin default 1 min 1 max 64")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "ucinewgame":
+            self.stop()
+            self.new_game()
+        elif command == "position":
+            self.stop()
+            self.set_position(arguments)
+        elif command == "go":
+            self.stop()
+            self.go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            return False
+
+        return True
+
+    def set_option(self, arguments):
+        # setoption name <name> value <value>
+        if "name" not in arguments or "value" not in arguments:
+            return
+
+        name = " ".join(arguments[arguments.index("name") + 1:arguments.index("value")]).lower()
+        value = " ".join(arguments[arguments.index("value") + 1:])
+
+        if name == "hash":
+            self.hash_size = max(1, int(value))
+        elif name == "threads":
+            self.workers = max(1, int(value))
+        else:
+            return
+
+        self.stop()
+        self.new_game()
+
+    def set_position(self, arguments):
+        # position startpos | fen <fen> [moves <move> ...]
+        moves = []
+        if "moves" in arguments:
+            moves = arguments[arguments.index("moves") + 1:]
+            arguments = arguments[:arguments.index("moves")]
+
+        # Build the new position on its own board, so the last good one is kept if anything is wrong with it
+        if arguments and arguments[0] == "fen":
+            board = BitBoard(" ".join(arguments[1:]))
+        else:
+            board = BitBoard()
+
+        for text in moves:
+            move = uci_to_move(text)
+
+            if move not in board.get_legal_moves(board.turn):
+                raise ValueError(f"illegal move {text}")
+
+            board.make_move(*move)
+
+        self.board = board
+
+    def go(self, arguments):
+        # go [depth <n>] [movetime <ms>] [wtime <ms>] [btime <ms>] [nodes <n>] [infinite]
+        limits = {}
+        for name, value in zip(arguments, arguments[1:]):
+            if name in ("depth", "movetime", "wtime", "btime", "nodes"):
+                limits[name] = int(value)
+
+        self.infinite = "infinite" in arguments
+        if self.infinite:
+            limits = {}
+
+        engine = self.engine
+        colour = self.board.turn
+
+        engine.begin_search(self.board)
+        engine.MAX_DEPTH = limits.get("depth", MAX_DEPTH)
+        engine.node_limit = limits.get("nodes")
+
+        now = time.perf_counter()
+        clock = limits.get("wtime" if colour == 1 else "btime")
+
+        if "movetime" in limits:
+            engine.hard_deadline = now + limits["movetime"] / 1000
+        elif clock is not None:
+            soft, hard = engine.allocate_time(clock / 1000)
+            engine.soft_deadline = now + soft
+            engine.hard_deadline = now + hard
+
+        self.thread = threading.Thread(target=self.search, args=(colour,), daemon=True)
+        self.thread.start()
+
+    def search(self, colour):
+        move, line = self.engine.search(self.board, colour, self.workers > 1)
+        self.engine.node_limit = None
+
+        if self.infinite:
+            self.stop_requested.wait()
+
+        if not move:
+            self.send("bestmove 0000")
+            return
+
+        # Suggest the expected reply from the principal variation for the GUI to ponder on
+        ponder = ""
+        if len(line) > 1 and line[0] == move:
+            self.board.make_move(*move)
+            ponder = f" ponder {move_to_uci(self.board, line[1])}"
+            self.board.unmake_move()
+
+        self.send(f"bestmove {move_to_uci(self.board, move)}{ponder}")
+
+    def send_info(self, depth, score, stats):
+        # Play through the principal variation to tell which moves are promotions
+        pv = []
+        for move in self.engine.pv:
+            pv.append(move_to_uci(self.board, move))
+            self.board.make_move(*move)
+
+        for _ in self.engine.pv:
+            self.board.unmake_move()
+
+        self.send(
+            f"info depth {depth} score {format_score(score)} nodes {stats.nodes} nps {stats.nps} "
+            f"time {int(stats.seconds * 1000)} hashfull {int(stats.table_fill * 1000)} pv {' '.join(pv)}"
+        )
+
+    def stop(self):
+        """Stops the running search, which still reports its best move"""
+        if self.thread:
+            # The parallel search checks this while waiting on its workers too, so a stop is always prompt
+            self.engine.stopped = True
+            self.stop_requested.set()
+            self.thread.join()
+
+            self.engine.stopped = False
+            self.stop_requested.clear()
+            self.thread = None
+
+def main():
+    UCI().run()
+
+if __name__ == "__main__":
+    main()
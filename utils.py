@@ -1,3 +1,5 @@
+import re
+
 def clamp(n, min, max):
     """Keep numbers within a valid range"""
     if n < min: 
@@ -11,12 +13,17 @@ def fen_to_coords(fen):
     """Convert a FEN string to a dictionary of piece coordinates"""
     ranks = fen.split()[0].split("/") # Extract the board representation
     piece_positions = {}
+
+    if len(ranks) != 8:
+        raise ValueError(f"Invalid FEN piece placement, expected 8 ranks: {fen!r}")
     
     for rank_idx, rank in enumerate(ranks):
         file_idx = 0
         for char in rank:
             if char.isdigit():
                 file_idx += int(char) # Empty squares
+            elif char.lower() not in "pnbrqk":
+                raise ValueError(f"Invalid piece {char!r} in FEN: {fen!r}")
             else:
                 position = (file_idx, rank_idx) # Convert to (x, y) coordinates with (0,0) at the top left
                 if char in piece_positions:
@@ -24,9 +31,43 @@ def fen_to_coords(fen):
                 else:
                     piece_positions[char] = [position]
                 file_idx += 1
+
+        if file_idx != 8:
+            raise ValueError(f"Invalid FEN rank {rank!r}, expected 8 squares: {fen!r}")
         
     return piece_positions
 
+def parse_epd(line):
+    """Split an EPD line into a FEN string and a dictionary of its operations.
+
+    Operands are returned as a list of strings with any quotes removed, e.g. {"bm": ["Nf3", "e4"], "id": ["WAC.001"]}.
+    The move clocks come from the hmvc and fmvn operations if they're given.
+    """
+    fields = line.split(maxsplit=4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD, expected at least 4 fields: {line!r}")
+
+    operations = {}
+    for operation in re.findall(r'(?:[^;"]|"[^"]*")+', fields[4] if len(fields) > 4 else ""):
+        tokens = re.findall(r'"[^"]*"|\S+', operation)
+
+        if tokens:
+            operations[tokens[0]] = [token.strip('"') for token in tokens[1:]]
+
+    halfmove_clock = operations.get("hmvc", ["0"])[0]
+    fullmove_number = operations.get("fmvn", ["1"])[0]
+
+    return " ".join(fields[:4] + [halfmove_clock, fullmove_number]), operations
+
+def coords_to_notation(coords):
+    """Convert (x, y) coordinates to a square name such as e4"""
+    x, y = coords
+    return chr(x + ord("a")) + str(8 - y)
+
+def notation_to_coords(square):
+    """Convert a square name such as e4 to (x, y) coordinates"""
+    return (ord(square[0]) - ord("a"), 8 - int(square[1]))
+
 def move_to_pgn(move):
     start, end, piece, captured_piece, promoted_piece = move
 
@@ -59,6 +100,136 @@ def move_to_pgn(move):
 
     return pgn_move
 
+def pgn_to_move(board, san, colour):
+    """Convert a move in algebraic notation (e.g. "Nbd7", "exd5", "O-O") to a (start, end) move.
+
+    Returns None if the move isn't legal in the position or can't be played on this board
+    (pawns only ever promote to a queen).
+    """
+    san = san.rstrip("+#!?")
+    rank = 7 if colour == 1 else 0
+
+    if san in ("O-O", "0-0"):
+        candidates = [((4, rank), (6, rank))]
+    elif san in ("O-O-O", "0-0-0"):
+        candidates = [((4, rank), (2, rank))]
+    else:
+        if "=" in san:
+            san, promotion = san.split("=")
+            if promotion.upper() != "Q":
+                return None
+
+        piece_type = san[0].lower() if san[0] in "NBRQK" else "p"
+        if piece_type != "p":
+            san = san[1:]
+
+        end = notation_to_coords(san[-2:])
+        hint = san[:-2].replace("x", "") # Disambiguating file and/or rank
+
+        candidates = []
+        for start, move_end in board.get_legal_moves(colour):
+            if move_end != end or board.get_piece_at(start[0], start[1]).piece_type != piece_type:
+                continue
+
+            if all(character == coords_to_notation(start)[0 if character.isalpha() else 1] for character in hint):
+                candidates.append((start, move_end))
+
+        return candidates[0] if len(candidates) == 1 else None
+
+    return candidates[0] if candidates[0] in board.get_legal_moves(colour) else None
+
+def move_to_san(board, move, colour):
+    """Convert a legal (start, end) move to algebraic notation, before it's played on the board"""
+    start, end = move
+    piece = board.get_piece_at(start[0], start[1])
+    captured_piece = board.get_piece_at(end[0], end[1])
+
+    if piece.piece_type == "k" and abs(start[0] - end[0]) == 2:
+        san = "O-O" if end[0] == 6 else "O-O-O"
+    elif piece.piece_type == "p":
+        san = ""
+
+        # Diagonal pawn moves are always captures, including en passant
+        if start[0] != end[0]:
+            san = coords_to_notation(start)[0] + "x"
+
+        san += coords_to_notation(end)
+
+        if end[1] in (0, 7):
+            san += "=Q"
+    else:
+        # Name the start file, rank or both if another piece of the same type can reach the square
+        others = [
+            other for other, other_end in board.get_legal_moves(colour)
+            if other_end == end and other != start and board.get_piece_at(other[0], other[1]).piece_type == piece.piece_type
+        ]
+
+        hint = ""
+        if others:
+            if all(other[0] != start[0] for other in others):
+                hint = coords_to_notation(start)[0]
+            elif all(other[1] != start[1] for other in others):
+                hint = coords_to_notation(start)[1]
+            else:
+                hint = coords_to_notation(start)
+
+        san = piece.piece_type.upper() + hint + ("x" if captured_piece else "") + coords_to_notation(end)
+
+    board.make_move(start, end)
+
+    if board.in_check(-colour):
+        san += "#" if not board.get_legal_moves(-colour) else "+"
+
+    board.unmake_move()
+
+    return san
+
+def read_pgn_games(file):
+    """Yields (headers, moves) for each game in a PGN file, one game at a time.
+
+    Comments, variations, move numbers and annotations are removed, so moves is a list of
+    algebraic notation strings.
+    """
+    headers = {}
+    movetext = []
+
+    def parse_moves(text):
+        text = re.sub(r"\{[^}]*\}|;[^\n]*", " ", text) # Comments
+
+        # Variations can be nested, so remove the innermost ones until none are left
+        while "(" in text:
+            text, count = re.subn(r"\([^()]*\)", " ", text)
+            if not count:
+                break
+
+        moves = []
+        for token in text.split():
+            token = re.sub(r"^\d+\.+", "", token) # Move numbers, possibly attached to the move
+
+            if token and not token.startswith("$") and token not in ("1-0", "0-1", "1/2-1/2", "*"):
+                moves.append(token)
+
+        return moves
+
+    for line in file:
+        line = line.strip()
+
+        if line.startswith("["):
+            # A header after some moves is the start of the next game
+            if movetext:
+                yield headers, parse_moves(" ".join(movetext))
+                headers = {}
+                movetext = []
+
+            match = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif line:
+            movetext.append(line)
+
+    if movetext or headers:
+        yield headers, parse_moves(" ".join(movetext))
+
 def format_seconds(seconds):
     minutes = seconds // 60
     remaining_seconds = seconds % 60